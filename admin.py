@@ -2,20 +2,58 @@ import streamlit as st
 import os
 from pathlib import Path
 import shutil
+import threading
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 
-from utils import load_settings, save_settings, get_file_path, create_directory_if_not_exists, format_datetime
-from models import load_requests, update_request, delete_request, ResourceRequest, get_request_stats
+from utils import get_file_path, create_directory_if_not_exists, format_datetime, send_queued_notifications
+from catalog_store import (
+    get_catalog, add_university, add_semester, add_course,
+    remove_university, remove_semester, remove_course
+)
+from catalog_io import import_uploaded_file, export_catalog_text
+from archives import ingest_archive
+from catalog import CatalogError
+from storage import (
+    rollover_semester, rename_catalog_entry, find_orphans, collect_upload_garbage,
+    quarantine_report, get_last_gc_run, GC_GRACE_PERIOD_SECONDS,
+    store_uploads, deduplicate_uploads, get_deduplication_report
+)
+from resources import RESOURCE_TYPE_DIRS, list_resources, record_resources, forget_resource, forget_course, forget_in_index
+from thumbnails import get_thumbnail_queue_length, queue_thumbnails
+from watcher import get_watcher_status, reconcile_index
+from downloads import get_download_status, mount_download_endpoint
+from models import load_requests, update_request, delete_request, ResourceRequest, get_request_stats, get_most_wanted, fulfill_open_requests
+
+def show_rename_form(kind, names, parent_path, key):
+    """Admin form for renaming a university, semester or course"""
+    if not names:
+        return
+    
+    st.write(f"Rename {kind.title()}:")
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        current_name = st.selectbox(f"Current {kind.title()} Name", names, key=f"{key}_current")
+    with col2:
+        new_name = st.text_input(f"New {kind.title()} Name", key=f"{key}_new")
+    with col3:
+        if st.button("Rename", key=f"{key}_btn"):
+            try:
+                # Moves the upload folder along with the catalog entry
+                rename_catalog_entry(tuple(parent_path) + (current_name,), new_name)
+                st.success(f"Renamed {current_name} to {new_name}!")
+                st.rerun()
+            except CatalogError as e:
+                st.error(str(e))
 
 def manage_universities():
     """Admin interface for managing universities"""
     st.subheader("Manage Universities")
     
-    settings = st.session_state.settings
-    universities = settings.get("universities", [])
+    catalog = get_catalog()
+    universities = catalog.universities()
     
     # Display existing universities
     st.write("Current Universities:")
@@ -25,15 +63,9 @@ def manage_universities():
             st.write(f"{i+1}. {uni}")
         with col2:
             if st.button("Remove", key=f"remove_uni_{i}"):
-                # Check if university has semesters before removing
-                if uni in settings.get("semesters", {}):
-                    for semester in settings["semesters"][uni]:
-                        key = f"{uni}_{semester}"
-                        if key in settings.get("courses", {}):
-                            settings["courses"].pop(key, None)
-                    settings["semesters"].pop(uni, None)
-                universities.remove(uni)
-                save_settings(settings)
+                # Removes the university's semesters and courses with it
+                forget_in_index((uni,))
+                remove_university(uni)
                 st.rerun()
     
     # Add new university
@@ -41,25 +73,22 @@ def manage_universities():
     new_uni = st.text_input("University Name", key="new_uni_input")
     if st.button("Add University"):
         if new_uni and new_uni not in universities:
-            universities.append(new_uni)
-            settings["universities"] = universities
-            if "semesters" not in settings:
-                settings["semesters"] = {}
-            settings["semesters"][new_uni] = []
-            save_settings(settings)
+            add_university(new_uni)
             st.success(f"Added {new_uni} to universities!")
             st.rerun()
         elif new_uni in universities:
             st.error(f"{new_uni} already exists!")
         else:
             st.error("Please enter a university name!")
+    
+    show_rename_form("university", universities, (), "rename_uni")
 
 def manage_semesters():
     """Admin interface for managing semesters for each university"""
     st.subheader("Manage Semesters")
     
-    settings = st.session_state.settings
-    universities = settings.get("universities", [])
+    catalog = get_catalog()
+    universities = catalog.universities()
     
     if not universities:
         st.warning("No universities available. Please add a university first.")
@@ -69,12 +98,7 @@ def manage_semesters():
     selected_uni = st.selectbox("Select University", universities, key="semester_uni_select")
     
     if selected_uni:
-        if "semesters" not in settings:
-            settings["semesters"] = {}
-        if selected_uni not in settings["semesters"]:
-            settings["semesters"][selected_uni] = []
-        
-        semesters = settings["semesters"][selected_uni]
+        semesters = catalog.semesters(selected_uni)
         
         # Display existing semesters
         st.write(f"Current Semesters for {selected_uni}:")
@@ -84,12 +108,9 @@ def manage_semesters():
                 st.write(f"{i+1}. {semester}")
             with col2:
                 if st.button("Remove", key=f"remove_sem_{i}"):
-                    # Check if courses exist for this semester before removing
-                    key = f"{selected_uni}_{semester}"
-                    if key in settings.get("courses", {}):
-                        settings["courses"].pop(key, None)
-                    semesters.remove(semester)
-                    save_settings(settings)
+                    # Removes the semester's courses with it
+                    forget_in_index((selected_uni, semester))
+                    remove_semester(selected_uni, semester)
                     st.rerun()
         
         # Add new semester
@@ -97,22 +118,45 @@ def manage_semesters():
         new_semester = st.text_input("Semester Name", key="new_semester_input")
         if st.button("Add Semester"):
             if new_semester and new_semester not in semesters:
-                semesters.append(new_semester)
-                settings["semesters"][selected_uni] = semesters
-                save_settings(settings)
+                add_semester(selected_uni, new_semester)
                 st.success(f"Added {new_semester} to {selected_uni} semesters!")
                 st.rerun()
             elif new_semester in semesters:
                 st.error(f"{new_semester} already exists for {selected_uni}!")
             else:
                 st.error("Please enter a semester name!")
+        
+        show_rename_form("semester", semesters, (selected_uni,), "rename_sem")
+        
+        # Roll a semester's courses over to the next term
+        if semesters:
+            st.write(f"Roll Over a Semester for {selected_uni}:")
+            rollover_source = st.selectbox("Copy Courses From", semesters, key="rollover_source_select")
+            rollover_target = st.text_input("New Semester Name", key="rollover_target_input")
+            carry_resources = st.checkbox(
+                "Carry resources forward (linked, no extra disk space where supported)",
+                key="rollover_carry_resources"
+            )
+            if st.button("Roll Over Semester"):
+                if not rollover_target:
+                    st.error("Please enter a semester name!")
+                elif rollover_target == rollover_source:
+                    st.error("Please choose a different semester name!")
+                else:
+                    summary = rollover_semester(selected_uni, rollover_source, rollover_target, carry_resources)
+                    if summary is None:
+                        st.error("Failed to roll over the semester.")
+                    else:
+                        files = ", ".join(f"{count} by {method}" for method, count in summary["files"].items())
+                        st.success(f"Added {len(summary['courses'])} courses to {rollover_target}."
+                                   + (f" Carried files forward: {files}." if files else ""))
 
 def manage_courses():
     """Admin interface for managing courses for each university and semester"""
     st.subheader("Manage Courses")
     
-    settings = st.session_state.settings
-    universities = settings.get("universities", [])
+    catalog = get_catalog()
+    universities = catalog.universities()
     
     if not universities:
         st.warning("No universities available. Please add a university first.")
@@ -122,12 +166,7 @@ def manage_courses():
     selected_uni = st.selectbox("Select University", universities, key="course_uni_select")
     
     if selected_uni:
-        if "semesters" not in settings:
-            settings["semesters"] = {}
-        if selected_uni not in settings["semesters"]:
-            settings["semesters"][selected_uni] = []
-        
-        semesters = settings["semesters"][selected_uni]
+        semesters = catalog.semesters(selected_uni)
         
         if not semesters:
             st.warning(f"No semesters available for {selected_uni}. Please add a semester first.")
@@ -137,13 +176,7 @@ def manage_courses():
         selected_semester = st.selectbox("Select Semester", semesters, key="course_sem_select")
         
         if selected_semester:
-            key = f"{selected_uni}_{selected_semester}"
-            if "courses" not in settings:
-                settings["courses"] = {}
-            if key not in settings["courses"]:
-                settings["courses"][key] = []
-            
-            courses = settings["courses"][key]
+            courses = catalog.courses(selected_uni, selected_semester)
             
             # Display existing courses
             st.write(f"Current Courses for {selected_uni}, {selected_semester}:")
@@ -157,8 +190,8 @@ def manage_courses():
                         course_path = get_file_path(selected_uni, selected_semester, course)
                         if os.path.exists(course_path):
                             shutil.rmtree(course_path)
-                        courses.remove(course)
-                        save_settings(settings)
+                        forget_course(selected_uni, selected_semester, course)
+                        remove_course(selected_uni, selected_semester, course)
                         st.rerun()
             
             # Add new course
@@ -166,9 +199,7 @@ def manage_courses():
             new_course = st.text_input("Course Name", key="new_course_input")
             if st.button("Add Course"):
                 if new_course and new_course not in courses:
-                    courses.append(new_course)
-                    settings["courses"][key] = courses
-                    save_settings(settings)
+                    add_course(selected_uni, selected_semester, new_course)
                     
                     # Create course directories
                     course_path = get_file_path(selected_uni, selected_semester, new_course)
@@ -183,13 +214,39 @@ def manage_courses():
                     st.error(f"{new_course} already exists for {selected_uni}, {selected_semester}!")
                 else:
                     st.error("Please enter a course name!")
+            
+            show_rename_form("course", courses, (selected_uni, selected_semester), "rename_course")
+
+def bulk_catalog_tools():
+    """Admin interface for importing and exporting courses in bulk"""
+    with st.expander("Bulk Import / Export"):
+        st.write("Import a CSV (with a university,semester,course header) or JSONL file. "
+                 "Missing universities and semesters are created and existing courses are skipped.")
+        catalog_file = st.file_uploader("Choose a catalog file", type=["csv", "jsonl"], key="catalog_import_file")
+        if catalog_file is not None and st.button("Import Courses"):
+            summary = import_uploaded_file(catalog_file)
+            for error in summary["errors"][:20]:
+                st.error(error)
+            if summary["added"]:
+                st.success(f"Imported {summary['added']} courses, skipped {summary['skipped']} already in the catalog.")
+            else:
+                st.info(f"No new courses imported, skipped {summary['skipped']} already in the catalog.")
+        
+        export_format = st.selectbox("Export Format", ["csv", "jsonl"], key="catalog_export_format")
+        if st.button("Export Catalog"):
+            st.download_button(
+                "Download Catalog",
+                data=export_catalog_text(export_format),
+                file_name=f"catalog.{export_format}",
+                mime="text/csv" if export_format == "csv" else "application/x-ndjson"
+            )
 
 def upload_resources():
     """Admin interface for uploading resources for each course"""
     st.subheader("Upload Resources")
     
-    settings = st.session_state.settings
-    universities = settings.get("universities", [])
+    catalog = get_catalog()
+    universities = catalog.universities()
     
     if not universities:
         st.warning("No universities available. Please add a university first.")
@@ -199,15 +256,7 @@ def upload_resources():
     selected_uni = st.selectbox("Select University", universities, key="upload_uni_select")
     
     if selected_uni:
-        if "semesters" not in settings:
-            st.warning(f"No semesters available for {selected_uni}. Please add a semester first.")
-            return
-            
-        if selected_uni not in settings["semesters"]:
-            st.warning(f"No semesters available for {selected_uni}. Please add a semester first.")
-            return
-        
-        semesters = settings["semesters"][selected_uni]
+        semesters = catalog.semesters(selected_uni)
         
         if not semesters:
             st.warning(f"No semesters available for {selected_uni}. Please add a semester first.")
@@ -217,12 +266,7 @@ def upload_resources():
         selected_semester = st.selectbox("Select Semester", semesters, key="upload_sem_select")
         
         if selected_semester:
-            key = f"{selected_uni}_{selected_semester}"
-            if "courses" not in settings or key not in settings["courses"]:
-                st.warning(f"No courses available for {selected_uni}, {selected_semester}. Please add a course first.")
-                return
-            
-            courses = settings["courses"][key]
+            courses = catalog.courses(selected_uni, selected_semester)
             
             if not courses:
                 st.warning(f"No courses available for {selected_uni}, {selected_semester}. Please add a course first.")
@@ -233,54 +277,133 @@ def upload_resources():
             
             if selected_course:
                 # Select resource type
-                resource_type = st.selectbox("Select Resource Type", ["Exams", "Study Sheets", "Tips & Notes"], key="resource_type_select")
-                
-                # Map resource type to directory
-                type_to_dir = {
-                    "Exams": "exams",
-                    "Study Sheets": "sheets",
-                    "Tips & Notes": "tips"
-                }
+                resource_type = st.selectbox("Select Resource Type", catalog.resource_types(selected_uni, selected_semester, selected_course), key="resource_type_select")
                 
-                dir_name = type_to_dir[resource_type]
+                dir_name = RESOURCE_TYPE_DIRS[resource_type]
                 
                 # Get resource path
                 resource_path = get_file_path(selected_uni, selected_semester, selected_course) / dir_name
-                create_directory_if_not_exists(resource_path)
                 
                 # Display existing resources
                 st.write(f"Current {resource_type} for {selected_course}:")
-                existing_files = os.listdir(resource_path) if os.path.exists(resource_path) else []
+                existing_files = list_resources(selected_uni, selected_semester, selected_course, resource_type)
                 
                 if existing_files:
-                    for i, file in enumerate(existing_files):
+                    for i, entry in enumerate(existing_files):
+                        file = entry["name"]
                         col1, col2 = st.columns([4, 1])
                         with col1:
-                            st.write(f"{i+1}. {file}")
+                            st.write(f"{i+1}. {file} ({entry['size'] / 1024:.1f} KB)")
                         with col2:
                             if st.button("Delete", key=f"delete_file_{i}"):
                                 file_path = resource_path / file
                                 if os.path.exists(file_path):
                                     os.remove(file_path)
-                                    st.success(f"Deleted {file}!")
-                                    st.rerun()
+                                # Drop the entry even if the file was already gone
+                                forget_resource(selected_uni, selected_semester, selected_course, resource_type, file)
+                                st.success(f"Deleted {file}!")
+                                st.rerun()
                 else:
                     st.info(f"No {resource_type.lower()} uploaded yet.")
                 
-                # Upload new resource
+                # Upload new resources
                 st.write(f"Upload New {resource_type} for {selected_course}:")
-                uploaded_file = st.file_uploader(f"Choose a file for {resource_type}", key=f"file_upload_{dir_name}")
+                # The uploader gets a fresh key after each batch so it is empty after the rerun
+                upload_round = st.session_state.get("upload_round", 0)
+                uploaded_files = st.file_uploader(
+                    f"Choose files for {resource_type}",
+                    accept_multiple_files=True,
+                    key=f"file_upload_{dir_name}_{upload_round}"
+                )
                 
-                if uploaded_file is not None:
-                    # Save the uploaded file
-                    file_path = resource_path / uploaded_file.name
+                if uploaded_files and st.button(f"Upload {len(uploaded_files)} File(s)", key=f"upload_{dir_name}"):
+                    create_directory_if_not_exists(resource_path)
+                    # A name picked twice keeps the last file
+                    by_name = {uploaded_file.name: uploaded_file for uploaded_file in uploaded_files}
+                    
+                    # Each file is stored once by content and linked into the course folder, in parallel
+                    progress = st.progress(0.0, text=f"Uploading {len(by_name)} file(s)...")
+                    results = store_uploads(
+                        [(uploaded_file, resource_path / name) for name, uploaded_file in by_name.items()],
+                        on_progress=lambda done, total: progress.progress(done / total, text=f"Uploaded {done} of {total} file(s)")
+                    )
+                    stored = [(file_path, sha256) for file_path, sha256, error in results if error is None]
+                    for file_path, _, error in results:
+                        if error is not None:
+                            st.error(f"{file_path.name}: {error}")
+                    if not stored:
+                        return
+                    
+                    # One index transaction and one thumbnail queue write for the batch
+                    record_resources([
+                        (selected_uni, selected_semester, selected_course, resource_type, file_path.name, sha256)
+                        for file_path, sha256 in stored
+                    ])
+                    queue_thumbnails(stored)
                     
-                    with open(file_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
+                    # Close any open requests this batch answers
+                    names = ", ".join(file_path.name for file_path, _ in stored)
+                    fulfilled = fulfill_open_requests(
+                        selected_uni, selected_semester, selected_course, resource_type,
+                        f"Fulfilled automatically: {names} uploaded on {datetime.now().strftime('%Y-%m-%d')}."
+                    )
+                    if fulfilled:
+                        threading.Thread(target=send_queued_notifications, daemon=True).start()
                     
-                    st.success(f"File {uploaded_file.name} uploaded successfully!")
+                    st.session_state.upload_round = upload_round + 1
+                    if len(stored) < len(results):
+                        # Keep the errors on screen; the files that made it show up on the next rerun
+                        st.success(f"{len(stored)} of {len(results)} file(s) uploaded.")
+                        return
+                    st.success(f"{len(stored)} file(s) uploaded successfully!")
                     st.rerun()
 
+def archive_ingestion():
+    """Admin interface for storing a ZIP or TAR of resources in their course folders"""
+    with st.expander("Import Archive"):
+        st.write("Upload a ZIP or TAR with files in University/Semester/Course/Type folders, where Type is "
+                 "Exams, Study Sheets or Tips & Notes (or exams, sheets, tips). A manifest.csv at the top with a "
+                 "path,university,semester,course,resource_type header places the files it lists instead. "
+                 "Only courses already in the catalog are filled.")
+        upload_round = st.session_state.get("archive_round", 0)
+        archive_file = st.file_uploader(
+            "Choose an archive",
+            type=["zip", "tar", "tgz", "gz", "bz2", "xz"],
+            key=f"archive_upload_{upload_round}"
+        )
+        if archive_file is not None and st.button("Import Archive"):
+            progress = st.progress(0.0, text="Reading the archive...")
+            
+            def show_progress(done, total):
+                if total:
+                    progress.progress(done / total, text=f"Stored {done} of {total} file(s)")
+                else:
+                    progress.progress(0.0, text=f"Stored {done} file(s)")
+            
+            summary = ingest_archive(archive_file, on_progress=show_progress)
+            progress.empty()
+            for message in summary["errors"][:20]:
+                st.error(message)
+            for message in summary["skipped"][:20]:
+                st.warning(f"Skipped {message}")
+            if not summary["written"]:
+                st.info("No files were stored.")
+                return
+            
+            # Close any open requests the archive answers, once per folder
+            fulfilled = []
+            today = datetime.now().strftime('%Y-%m-%d')
+            for key, names in summary["folders"].items():
+                fulfilled += fulfill_open_requests(
+                    *key, f"Fulfilled automatically: {', '.join(names)} uploaded on {today}."
+                )
+            if fulfilled:
+                threading.Thread(target=send_queued_notifications, daemon=True).start()
+            
+            st.session_state.archive_round = upload_round + 1
+            st.success(f"Stored {summary['written']} file(s) in {len(summary['folders'])} folder(s), "
+                       f"skipped {len(summary['skipped'])}.")
+
 def manage_requests():
     """Admin interface for managing resource requests"""
     st.subheader("Manage Resource Requests")
@@ -325,14 +448,16 @@ def manage_requests():
         st.info("No requests match the selected filters.")
         return
     
-    # Sort requests: high priority first, then by creation date (newest first)
+    # Sort requests: high priority first, then by votes, then by creation date (newest first)
     priority_order = {
         ResourceRequest.PRIORITY_HIGH: 1,
         ResourceRequest.PRIORITY_MEDIUM: 2,
         ResourceRequest.PRIORITY_LOW: 3
     }
     
-    filtered_requests.sort(key=lambda r: (priority_order.get(r.priority, 999), r.created_at), reverse=True)
+    filtered_requests.sort(key=lambda r: (
+        priority_order.get(r.priority, 999), -r.vote_count, -datetime.fromisoformat(r.created_at).timestamp()
+    ))
     
     # Display requests
     for i, request in enumerate(filtered_requests):
@@ -352,6 +477,12 @@ def manage_requests():
                 st.markdown(f"**Priority:** {request.priority}")
                 st.markdown(f"**Created:** {format_datetime(request.created_at)}")
                 st.markdown(f"**Last Updated:** {format_datetime(request.updated_at)}")
+                st.markdown(f"**Votes:** {request.vote_count}")
+            
+            if request.supporters:
+                st.markdown("**Supporters:** " + ", ".join(
+                    f"{s.get('email')} ({format_datetime(s.get('timestamp'))})" for s in request.supporters
+                ))
             
             # Update form
             with st.form(key=f"update_request_{request.request_id}"):
@@ -498,6 +629,16 @@ def request_analytics():
         )
         st.plotly_chart(fig, use_container_width=True)
     
+    # Most wanted resources, served from the open-request counters
+    most_wanted = get_most_wanted(limit=10)
+    if most_wanted:
+        st.subheader("Most Wanted Resources")
+        wanted_df = pd.DataFrame(
+            [list(key) + [count] for key, count in most_wanted],
+            columns=["University", "Semester", "Course", "Resource Type", "Students Waiting"]
+        )
+        st.dataframe(wanted_df, use_container_width=True)
+    
     # Request table view
     st.subheader("Raw Request Data")
     
@@ -523,6 +664,83 @@ def request_analytics():
             
             st.dataframe(display_df, use_container_width=True)
 
+def manage_storage():
+    """Admin interface for reclaiming space from orphaned upload folders"""
+    st.subheader("Storage Cleanup")
+    st.write("Upload folders without a matching university, semester or course are moved to "
+             f"quarantine and deleted after {GC_GRACE_PERIOD_SECONDS // 86400} days, and stored "
+             "contents no course links to any more are deleted. A background job does this automatically.")
+    
+    last_run = get_last_gc_run()
+    if last_run:
+        st.markdown(f"**Last run:** {format_datetime(last_run['finished_at'])} - "
+                    f"quarantined {last_run['quarantined']} folders, "
+                    f"freed {(last_run['freed_bytes'] + last_run['blob_freed_bytes']) / 1048576:.1f} MB")
+        if last_run.get("refused"):
+            st.warning(f"Orphaned folders were not quarantined: {last_run['refused']}.")
+    
+    if st.button("Scan for Orphaned Folders"):
+        orphans = find_orphans()
+        if orphans:
+            total = sum(size for _, size in orphans)
+            st.warning(f"{len(orphans)} orphaned folders, {total / 1048576:.1f} MB reclaimable.")
+            st.dataframe(pd.DataFrame(
+                [(str(path), size / 1048576) for path, size in orphans],
+                columns=["Folder", "Size (MB)"]
+            ), use_container_width=True)
+        else:
+            st.success("No orphaned folders found.")
+    
+    if st.button("Run Cleanup Now"):
+        threading.Thread(target=collect_upload_garbage, daemon=True).start()
+        st.info("Cleanup started in the background.")
+    
+    batches = quarantine_report()
+    if batches:
+        st.write("Quarantined:")
+        st.dataframe(pd.DataFrame(
+            [(name, size / 1048576) for name, size in batches],
+            columns=["Batch", "Size (MB)"]
+        ), use_container_width=True)
+    
+    st.subheader("Deduplication")
+    report = get_deduplication_report()
+    st.write("Each uploaded file's content is stored once and linked into every course that has it.")
+    st.markdown(f"**{report['files']} files:** {report['bytes'] / 1048576:.1f} MB in courses, "
+                f"{report['unique_bytes'] / 1048576:.1f} MB stored, "
+                f"**{report['saved_bytes'] / 1048576:.1f} MB saved**")
+    
+    if st.button("Deduplicate Existing Files"):
+        threading.Thread(target=deduplicate_uploads, daemon=True).start()
+        st.info("Deduplication started in the background.")
+    
+    st.subheader("Resource Index")
+    status = get_watcher_status()
+    if status["inotify"]:
+        st.write("Changes made to the uploads folder outside the app are picked up as they happen.")
+    else:
+        st.write("Changes made to the uploads folder outside the app are picked up by a periodic rescan.")
+    last_reconcile = status["last_reconcile"]
+    if last_reconcile:
+        st.markdown(f"**Last rescan:** {datetime.fromtimestamp(last_reconcile['finished_at']).strftime('%Y-%m-%d %H:%M')} - "
+                    f"{last_reconcile['folders']} folders, {last_reconcile['written']} files updated, "
+                    f"{last_reconcile['removed']} removed")
+    
+    if st.button("Rescan Uploads Now"):
+        threading.Thread(target=reconcile_index, daemon=True).start()
+        st.info("Rescan started in the background.")
+    
+    waiting = get_thumbnail_queue_length()
+    if waiting:
+        st.write(f"{waiting} image thumbnails are waiting to be made.")
+    
+    st.subheader("Downloads")
+    if mount_download_endpoint():
+        st.write("Files are streamed from the download endpoint.")
+    else:
+        st.warning("Downloads fell back to reading each file into the page when a student prepares it, "
+                   f"because {get_download_status()['reason']}.")
+
 def show_admin_panel():
     """Display the admin panel"""
     st.markdown('<div class="main-header"><h1>Admin Portal</h1><p>Manage universities, semesters, courses, and upload resources</p></div>', unsafe_allow_html=True)
@@ -555,7 +773,8 @@ def show_admin_panel():
         "Courses", 
         "Upload Resources", 
         "Resource Requests",
-        "Request Analytics"
+        "Request Analytics",
+        "Storage"
     ])
     
     with tabs[0]:
@@ -566,12 +785,17 @@ def show_admin_panel():
     
     with tabs[2]:
         manage_courses()
+        bulk_catalog_tools()
     
     with tabs[3]:
         upload_resources()
+        archive_ingestion()
     
     with tabs[4]:
         manage_requests()
     
     with tabs[5]:
         request_analytics()
+    
+    with tabs[6]:
+        manage_storage()
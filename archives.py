@@ -0,0 +1,208 @@
+"""
+Archive ingestion for the Student Resource Portal
+Fans a ZIP or TAR of course material out into the course folders
+
+Entries are placed by their last four folders, University/Semester/Course/
+Type/file, where Type is a resource type name or its folder name, so a
+wrapper folder around the whole tree is fine. A manifest.csv at the top of
+the archive with a path,university,semester,course,resource_type header
+places the entries it lists instead. Entries are streamed into the blob
+store, so the archive is never extracted to a temporary directory.
+
+Usage:
+    python archives.py semester.zip
+"""
+import csv
+import io
+import os
+import sys
+import tarfile
+import zipfile
+from pathlib import PurePosixPath
+
+if __name__ == "__main__":
+    from script_path import prefer_installed_streamlit
+    prefer_installed_streamlit()
+
+from catalog_store import get_catalog
+from resources import RESOURCE_TYPE_DIRS, get_resource_dir, record_resources
+from storage import MAX_UPLOAD_BYTES, store_upload, store_uploads
+from thumbnails import queue_thumbnails
+
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_FIELDS = ["path", "university", "semester", "course", "resource_type"]
+
+# Resource types by display name and by folder name
+RESOURCE_TYPE_NAMES = {
+    **{name: name for name in RESOURCE_TYPE_DIRS},
+    **{dir_name: name for name, dir_name in RESOURCE_TYPE_DIRS.items()}
+}
+
+
+def _entry_path(name):
+    """Normalize an archive entry name to a relative POSIX path"""
+    return PurePosixPath(*[part for part in name.replace("\\", "/").split("/") if part not in ("", ".")])
+
+def read_manifest(stream):
+    """Map entry paths to (university, semester, course, resource type) from a manifest"""
+    manifest = {}
+    # Members of a streamed TAR cannot be wrapped for text, and a manifest is small
+    reader = csv.DictReader(io.StringIO(stream.read().decode("utf-8-sig"), newline=""))
+    for row in reader:
+        values = [str(row.get(field) or "").strip() for field in MANIFEST_FIELDS]
+        if all(values):
+            manifest[str(_entry_path(values[0]))] = tuple(values[1:])
+    return manifest
+
+def place_entry(catalog, path, manifest):
+    """
+    Find the resource folder an entry belongs in
+
+    Returns ((university, semester, course, resource type), file name), or
+    (None, reason) when the entry is not placed. Only courses and resource
+    types in the catalog are accepted, so entry names never pick a folder
+    outside the uploads tree.
+    """
+    file_name = path.name
+    if file_name.startswith(".") or "__MACOSX" in path.parts:
+        return None, "hidden file"
+    if str(path) in manifest:
+        university, semester, course, resource_type = manifest[str(path)]
+    elif len(path.parts) >= 5:
+        university, semester, course, resource_type = path.parts[-5:-1]
+    else:
+        return None, "not in a University/Semester/Course/Type folder or the manifest"
+
+    resource_type = RESOURCE_TYPE_NAMES.get(resource_type, resource_type)
+    if not catalog.get_id(university, semester, course):
+        return None, f"{university} / {semester} / {course} is not in the catalog"
+    if resource_type not in catalog.resource_types(university, semester, course):
+        return None, f"{course} does not offer {resource_type}"
+    return (university, semester, course, resource_type), file_name
+
+def _plan_zip(archive, catalog, summary):
+    """List (opener, key, file name) for the ZIP entries that can be placed"""
+    manifest = {}
+    if MANIFEST_NAME in archive.namelist():
+        with archive.open(MANIFEST_NAME) as f:
+            manifest = read_manifest(f)
+
+    # Keyed by target, so a file listed twice keeps the last entry
+    plan = {}
+    for info in archive.infolist():
+        path = _entry_path(info.filename)
+        if info.is_dir() or str(path) == MANIFEST_NAME:
+            continue
+        key, file_name = place_entry(catalog, path, manifest)
+        if key is None:
+            summary["skipped"].append(f"{info.filename}: {file_name}")
+        elif info.file_size > MAX_UPLOAD_BYTES:
+            summary["skipped"].append(f"{info.filename}: larger than {MAX_UPLOAD_BYTES // 1048576} MB")
+        else:
+            plan[(key, file_name)] = lambda info=info: archive.open(info)
+    return [(opener, key, file_name) for (key, file_name), opener in plan.items()]
+
+def _ingest_zip(archive, catalog, summary, on_progress):
+    """Write the placed entries of a ZIP in parallel, returns the stored files"""
+    plan = _plan_zip(archive, catalog, summary)
+    for key in {key for _, key, _ in plan}:
+        os.makedirs(get_resource_dir(*key), exist_ok=True)
+
+    # Each entry is decompressed on its own, so entries are read concurrently
+    results = store_uploads(
+        [(opener, get_resource_dir(*key) / file_name) for opener, key, file_name in plan],
+        on_progress=on_progress
+    )
+    stored = []
+    for (_, key, file_name), (_, sha256, error) in zip(plan, results):
+        if error is None:
+            stored.append((key, file_name, sha256))
+        else:
+            summary["errors"].append(f"{file_name}: {error}")
+    return stored
+
+def _ingest_tar(archive, catalog, summary, on_progress):
+    """Write the placed members of a TAR as they stream past, returns the stored files"""
+    # A TAR is one stream, compressed as a whole, so members can only be read
+    # in order; the manifest is used when it is the first file
+    manifest = {}
+    stored = {}
+    first_file = True
+    for member in archive:
+        if not member.isfile():
+            continue
+        path = _entry_path(member.name)
+        if str(path) == MANIFEST_NAME:
+            if first_file:
+                manifest = read_manifest(archive.extractfile(member))
+            else:
+                summary["skipped"].append(f"{member.name}: the manifest must come first in a TAR")
+            first_file = False
+            continue
+        first_file = False
+        key, file_name = place_entry(catalog, path, manifest)
+        if key is None:
+            summary["skipped"].append(f"{member.name}: {file_name}")
+            continue
+        target = get_resource_dir(*key) / file_name
+        try:
+            os.makedirs(target.parent, exist_ok=True)
+            stored[(key, file_name)] = store_upload(archive.extractfile(member), target)
+        except Exception as e:
+            summary["errors"].append(f"{member.name}: {e}")
+        if on_progress:
+            on_progress(len(stored), None)
+    return [(key, file_name, sha256) for (key, file_name), sha256 in stored.items()]
+
+def ingest_archive(stream, on_progress=None):
+    """
+    Store the files of a ZIP or TAR archive in their course folders
+
+    The stream must be seekable for a ZIP; a TAR, compressed or not, is read
+    front to back. The index and the thumbnail queue are updated in one
+    batch at the end. on_progress(done, total) is called as files are
+    written, with total None for a TAR. Returns a summary dict with written,
+    folders ((university, semester, course, resource type) -> file names),
+    skipped and errors (lists of messages).
+    """
+    summary = {"written": 0, "folders": {}, "skipped": [], "errors": []}
+    catalog = get_catalog()
+    try:
+        if zipfile.is_zipfile(stream):
+            stream.seek(0)
+            with zipfile.ZipFile(stream) as archive:
+                stored = _ingest_zip(archive, catalog, summary, on_progress)
+        else:
+            stream.seek(0)
+            with tarfile.open(fileobj=stream, mode="r|*") as archive:
+                stored = _ingest_tar(archive, catalog, summary, on_progress)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        summary["errors"].append(f"Could not read the archive: {e}")
+        return summary
+
+    if stored:
+        record_resources([(*key, file_name, sha256) for key, file_name, sha256 in stored])
+        queue_thumbnails([(get_resource_dir(*key) / file_name, sha256) for key, file_name, sha256 in stored])
+    for key, file_name, _ in stored:
+        summary["folders"].setdefault(key, []).append(file_name)
+    summary["written"] = len(stored)
+    return summary
+
+
+def main(argv):
+    """Command line entry point"""
+    if len(argv) != 2:
+        print(__doc__.strip())
+        return 1
+
+    with open(argv[1], "rb") as f:
+        summary = ingest_archive(f)
+    for message in summary["skipped"] + summary["errors"]:
+        print(message)
+    print(f"Stored {summary['written']} files in {len(summary['folders'])} folders, "
+          f"skipped {len(summary['skipped'])}, failed {len(summary['errors'])}.")
+    return 1 if summary["errors"] and not summary["written"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
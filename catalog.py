@@ -0,0 +1,328 @@
+"""
+Catalog for the Student Resource Portal
+Tree of universities, semesters, courses and their resource types
+"""
+import uuid
+
+# Resource types offered for a course unless the catalog says otherwise
+DEFAULT_RESOURCE_TYPES = ["Exams", "Study Sheets", "Tips & Notes"]
+
+
+class CatalogError(Exception):
+    """Raised when a catalog change is not valid"""
+
+
+class Catalog:
+    """
+    Tree of universities, semesters and courses with stable node IDs
+
+    Nodes are addressed either by ID or by their path of names, for example
+    ("MIT", "Fall 2023", "Physics 201"). Lookups are O(1); removals and
+    renames are O(size of the affected subtree).
+    """
+
+    KIND_UNIVERSITY = "university"
+    KIND_SEMESTER = "semester"
+    KIND_COURSE = "course"
+
+    KINDS = [KIND_UNIVERSITY, KIND_SEMESTER, KIND_COURSE]
+
+    def __init__(self):
+        """Initialize an empty catalog"""
+        self.nodes = {}  # id -> {"id", "kind", "name", "parent", "children", "resource_types"}
+        self.roots = []  # university ids in display order
+        self.by_path = {}  # path tuple -> id
+        self.journal = []  # operations applied since the catalog was loaded or copied
+        self.frozen = False
+        self.owned = None  # ids of nodes this copy may write, None when it owns every node
+
+    # Lookups
+
+    def get_id(self, *path):
+        """Get the ID of the node at a path, or None"""
+        return self.by_path.get(tuple(path))
+
+    def get_node(self, *path):
+        """Get the node at a path, or None"""
+        node_id = self.by_path.get(tuple(path))
+        return self.nodes[node_id] if node_id else None
+
+    def path_of(self, node_id):
+        """Get the path of names leading to a node"""
+        path = []
+        while node_id:
+            node = self.nodes[node_id]
+            path.append(node["name"])
+            node_id = node["parent"]
+        return tuple(reversed(path))
+
+    def _child_names(self, child_ids):
+        """Get the names of a list of nodes"""
+        return [self.nodes[child_id]["name"] for child_id in child_ids]
+
+    def universities(self):
+        """List university names"""
+        return self._child_names(self.roots)
+
+    def semesters(self, university):
+        """List the semester names of a university"""
+        node = self.get_node(university)
+        return self._child_names(node["children"]) if node else []
+
+    def courses(self, university, semester):
+        """List the course names of a university semester"""
+        node = self.get_node(university, semester)
+        return self._child_names(node["children"]) if node else []
+
+    def resource_types(self, university, semester, course):
+        """List the resource types offered for a course"""
+        node = self.get_node(university, semester, course)
+        return list(node["resource_types"]) if node else []
+
+    def iter_courses(self):
+        """Yield (university, semester, course) for every course"""
+        for path, node_id in self.by_path.items():
+            if self.nodes[node_id]["kind"] == self.KIND_COURSE:
+                yield path
+
+    # Mutations
+
+    def _check_writable(self):
+        """Refuse changes to a published snapshot"""
+        if self.frozen:
+            raise CatalogError("Catalog snapshot is read-only; use update_catalog to change it")
+
+    def _own(self, node_id):
+        """Get a node for writing, copying it first if it is shared with the catalog this was copied from"""
+        if self.owned is not None and node_id not in self.owned:
+            node = self.nodes[node_id]
+            self.nodes[node_id] = dict(node, children=list(node["children"]), resource_types=list(node["resource_types"]))
+            self.owned.add(node_id)
+        return self.nodes[node_id]
+
+    def _add_node(self, kind, parent_path, name, node_id=None, resource_types=None):
+        """Add a node under a parent path and return its ID"""
+        self._check_writable()
+        if not name:
+            raise CatalogError(f"Please enter a {kind} name!")
+
+        path = tuple(parent_path) + (name,)
+        if path in self.by_path:
+            raise CatalogError(f"{name} already exists!")
+
+        parent_id = None
+        if parent_path:
+            parent_id = self.by_path.get(tuple(parent_path))
+            if parent_id is None:
+                raise CatalogError(f"{', '.join(parent_path)} does not exist!")
+
+        node_id = node_id or uuid.uuid4().hex[:12]
+        self.nodes[node_id] = {
+            "id": node_id,
+            "kind": kind,
+            "name": name,
+            "parent": parent_id,
+            "children": [],
+            "resource_types": list(resource_types or DEFAULT_RESOURCE_TYPES) if kind == self.KIND_COURSE else []
+        }
+        self.by_path[path] = node_id
+        if self.owned is not None:
+            self.owned.add(node_id)
+        if parent_id:
+            self._own(parent_id)["children"].append(node_id)
+        else:
+            self.roots.append(node_id)
+        return node_id
+
+    def _remove_node(self, path):
+        """Remove a node and everything below it"""
+        self._check_writable()
+        node_id = self.by_path.get(tuple(path))
+        if node_id is None:
+            raise CatalogError(f"{', '.join(path)} does not exist!")
+
+        node = self.nodes[node_id]
+        if node["parent"]:
+            self._own(node["parent"])["children"].remove(node_id)
+        else:
+            self.roots.remove(node_id)
+
+        # Walk only the removed subtree
+        stack = [(node_id, tuple(path))]
+        while stack:
+            current_id, current_path = stack.pop()
+            current = self.nodes.pop(current_id)
+            self.by_path.pop(current_path, None)
+            for child_id in current["children"]:
+                stack.append((child_id, current_path + (self.nodes[child_id]["name"],)))
+
+    def _rename_node(self, path, new_name):
+        """Rename a node, re-keying the paths of its subtree"""
+        self._check_writable()
+        path = tuple(path)
+        node_id = self.by_path.get(path)
+        if node_id is None:
+            raise CatalogError(f"{', '.join(path)} does not exist!")
+        if not new_name:
+            raise CatalogError("Please enter a new name!")
+        new_path = path[:-1] + (new_name,)
+        if new_path in self.by_path:
+            raise CatalogError(f"{new_name} already exists!")
+
+        self._own(node_id)["name"] = new_name
+        stack = [(node_id, path, new_path)]
+        while stack:
+            current_id, old_current, new_current = stack.pop()
+            del self.by_path[old_current]
+            self.by_path[new_current] = current_id
+            for child_id in self.nodes[current_id]["children"]:
+                child_name = self.nodes[child_id]["name"]
+                stack.append((child_id, old_current + (child_name,), new_current + (child_name,)))
+
+    def apply(self, op):
+        """
+        Apply one catalog operation and record it in the journal
+
+        Operations are plain dicts so they can be written to and replayed
+        from the catalog patch log.
+        """
+        kind = op["op"]
+        if kind == "add":
+            self._add_node(op["kind"], op["path"][:-1], op["path"][-1], op["id"], op.get("resource_types"))
+        elif kind == "remove":
+            self._remove_node(op["path"])
+        elif kind == "rename":
+            self._rename_node(op["path"], op["name"])
+        else:
+            raise CatalogError(f"Unknown catalog operation {kind}")
+        self.journal.append(op)
+
+    def _add(self, kind, path, resource_types=None):
+        """Apply an add operation with a new node ID"""
+        op = {"op": "add", "kind": kind, "path": list(path), "id": uuid.uuid4().hex[:12]}
+        if resource_types:
+            op["resource_types"] = list(resource_types)
+        self.apply(op)
+        return op["id"]
+
+    def add_university(self, university):
+        """Add a university"""
+        return self._add(self.KIND_UNIVERSITY, (university,))
+
+    def add_semester(self, university, semester):
+        """Add a semester to a university"""
+        return self._add(self.KIND_SEMESTER, (university, semester))
+
+    def add_course(self, university, semester, course, resource_types=None):
+        """Add a course to a university semester"""
+        return self._add(self.KIND_COURSE, (university, semester, course), resource_types)
+
+    def remove(self, *path):
+        """Remove a node and everything below it"""
+        self.apply({"op": "remove", "path": list(path)})
+
+    def rename(self, path, new_name):
+        """Rename the node at a path"""
+        self.apply({"op": "rename", "path": list(path), "name": new_name})
+
+    # Copying and persistence
+
+    def copy(self):
+        """
+        Return a writable copy of the catalog
+
+        Node records are shared with this catalog and copied only when the
+        copy first changes them, so a transaction copies the nodes it touches
+        plus the flat id and path maps, not the whole tree.
+        """
+        clone = Catalog()
+        clone.nodes = dict(self.nodes)
+        clone.roots = list(self.roots)
+        clone.by_path = dict(self.by_path)
+        clone.owned = set()
+        return clone
+
+    def freeze(self):
+        """Make the catalog read-only and return it"""
+        self.frozen = True
+        return self
+
+    def _legacy_settings(self):
+        """Build the flat universities/semesters/courses settings layout"""
+        settings = {"universities": [], "semesters": {}, "courses": {}}
+        for uni_id in self.roots:
+            university = self.nodes[uni_id]
+            settings["universities"].append(university["name"])
+            settings["semesters"][university["name"]] = []
+            for sem_id in university["children"]:
+                semester = self.nodes[sem_id]
+                settings["semesters"][university["name"]].append(semester["name"])
+                settings["courses"][f"{university['name']}_{semester['name']}"] = self._child_names(semester["children"])
+        return settings
+
+    def to_settings(self):
+        """
+        Convert the catalog to the settings.json layout
+
+        The flat universities/semesters/courses keys are kept so older readers
+        of settings.json keep working; catalog_nodes holds the tree itself.
+        """
+        settings = self._legacy_settings()
+        nodes = {}
+        stack = list(reversed(self.roots))
+        while stack:
+            node = self.nodes[stack.pop()]
+            record = {"kind": node["kind"], "name": node["name"], "parent": node["parent"]}
+            if node["kind"] == self.KIND_COURSE and node["resource_types"] != DEFAULT_RESOURCE_TYPES:
+                record["resource_types"] = node["resource_types"]
+            nodes[node["id"]] = record
+            stack.extend(reversed(node["children"]))
+        settings["catalog_nodes"] = nodes
+        return settings
+
+    @classmethod
+    def _from_nodes(cls, nodes):
+        """Build a catalog from stored catalog_nodes records"""
+        catalog = cls()
+        for node_id, record in nodes.items():
+            parent_path = catalog.path_of(record["parent"]) if record.get("parent") else ()
+            catalog._add_node(record["kind"], parent_path, record["name"], node_id, record.get("resource_types"))
+        return catalog
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Build a catalog from the settings.json layout
+
+        The stored tree is used when it agrees with the flat keys. If the flat
+        keys were edited by something that does not know about the tree, the
+        catalog is rebuilt from them, keeping the IDs of nodes that still exist.
+        """
+        known_ids = {}
+        resource_types = {}
+        if settings.get("catalog_nodes"):
+            try:
+                catalog = cls._from_nodes(settings["catalog_nodes"])
+                legacy = catalog._legacy_settings()
+                if all(settings.get(key) == legacy[key] for key in legacy):
+                    return catalog
+                known_ids = {path: node_id for path, node_id in catalog.by_path.items()}
+                resource_types = {path: catalog.nodes[node_id]["resource_types"] for path, node_id in catalog.by_path.items()}
+            except (CatalogError, KeyError):
+                pass
+
+        catalog = cls()
+        for university in settings.get("universities", []):
+            if (university,) in catalog.by_path:
+                continue
+            catalog._add_node(cls.KIND_UNIVERSITY, (), university, known_ids.get((university,)))
+            for semester in settings.get("semesters", {}).get(university, []):
+                if (university, semester) in catalog.by_path:
+                    continue
+                catalog._add_node(cls.KIND_SEMESTER, (university,), semester, known_ids.get((university, semester)))
+                for course in settings.get("courses", {}).get(f"{university}_{semester}", []):
+                    path = (university, semester, course)
+                    if path in catalog.by_path:
+                        continue
+                    catalog._add_node(cls.KIND_COURSE, (university, semester), course, known_ids.get(path), resource_types.get(path))
+        return catalog
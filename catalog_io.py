@@ -0,0 +1,162 @@
+"""
+Bulk catalog import and export for the Student Resource Portal
+Streams university, semester, course rows from and to CSV or JSONL
+
+Usage:
+    python catalog_io.py import courses.csv
+    python catalog_io.py export courses.jsonl
+"""
+import csv
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == "__main__":
+    from script_path import prefer_installed_streamlit
+    prefer_installed_streamlit()
+
+from catalog import CatalogError
+from catalog_store import get_catalog, update_catalog
+from resources import RESOURCE_TYPE_DIRS
+from utils import get_file_path
+
+FIELDS = ["university", "semester", "course"]
+
+# Threads used to create course directory trees after an import
+DIRECTORY_WORKERS = 16
+
+
+def _detect_format(name):
+    """Guess the file format from a file name"""
+    return "jsonl" if name.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+def iter_rows(stream, fmt="csv"):
+    """
+    Yield (line number, row dict) pairs from a text stream
+
+    CSV input needs a university,semester,course header; JSONL input has one
+    object with those keys per line. Rows are read lazily, one at a time.
+    """
+    if fmt == "jsonl":
+        for line_no, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError:
+                    yield line_no, None
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+def import_catalog(stream, fmt="csv"):
+    """
+    Import courses from a stream in one catalog transaction
+
+    Missing universities and semesters are created. Rows that are incomplete
+    or already in the catalog (or earlier in the file) are skipped. Returns a
+    summary dict with added, skipped and errors (a list of messages).
+    """
+    summary = {"added": 0, "skipped": 0, "errors": []}
+    new_courses = []
+
+    def apply_rows(catalog):
+        for line_no, row in iter_rows(stream, fmt):
+            values = [str((row or {}).get(field) or "").strip() for field in FIELDS]
+            if not all(values):
+                summary["errors"].append(f"Line {line_no}: expected university, semester and course")
+                continue
+
+            university, semester, course = values
+            # The catalog's path index makes each duplicate check O(1)
+            if catalog.get_id(university, semester, course):
+                summary["skipped"] += 1
+                continue
+            if not catalog.get_id(university):
+                catalog.add_university(university)
+            if not catalog.get_id(university, semester):
+                catalog.add_semester(university, semester)
+            catalog.add_course(university, semester, course)
+            new_courses.append((university, semester, course))
+
+    try:
+        if not update_catalog(apply_rows):
+            summary["errors"].append("Failed to save the catalog.")
+            return summary
+    except CatalogError as e:
+        summary["errors"].append(str(e))
+        return summary
+
+    summary["added"] = len(new_courses)
+    create_course_directories(new_courses)
+    return summary
+
+def _create_course_directory(path):
+    """Create the resource folders of one course"""
+    course_path = get_file_path(*path)
+    for dir_name in RESOURCE_TYPE_DIRS.values():
+        os.makedirs(course_path / dir_name, exist_ok=True)
+
+def create_course_directories(paths):
+    """Create the resource folders of many courses in parallel"""
+    if not paths:
+        return
+    with ThreadPoolExecutor(max_workers=DIRECTORY_WORKERS) as executor:
+        list(executor.map(_create_course_directory, paths))
+
+def export_catalog(stream, fmt="csv"):
+    """Write every course in the catalog to a stream, one row at a time"""
+    catalog = get_catalog()
+    count = 0
+    if fmt == "jsonl":
+        for university, semester, course in catalog.iter_courses():
+            stream.write(json.dumps({"university": university, "semester": semester, "course": course}) + "\n")
+            count += 1
+    else:
+        writer = csv.writer(stream)
+        writer.writerow(FIELDS)
+        for path in catalog.iter_courses():
+            writer.writerow(path)
+            count += 1
+    return count
+
+def import_uploaded_file(uploaded_file):
+    """Import a file from st.file_uploader without reading it into one string"""
+    # utf-8-sig drops the byte order mark Excel writes, which would otherwise
+    # end up in the first header name
+    stream = io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline="")
+    return import_catalog(stream, _detect_format(uploaded_file.name))
+
+def export_catalog_text(fmt="csv"):
+    """Export the catalog to a string for a download button"""
+    buffer = io.StringIO()
+    export_catalog(buffer, fmt)
+    return buffer.getvalue()
+
+
+def main(argv):
+    """Command line entry point"""
+    if len(argv) != 3 or argv[1] not in ("import", "export"):
+        print(__doc__.strip())
+        return 1
+
+    command, path = argv[1], argv[2]
+    fmt = _detect_format(path)
+    if command == "import":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            summary = import_catalog(f, fmt)
+        for error in summary["errors"]:
+            print(error)
+        print(f"Added {summary['added']} courses, skipped {summary['skipped']} already in the catalog.")
+        return 1 if summary["errors"] and not summary["added"] else 0
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        count = export_catalog(f, fmt)
+    print(f"Exported {count} courses to {path}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
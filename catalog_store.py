@@ -0,0 +1,218 @@
+"""
+Catalog store for the Student Resource Portal
+Persists the catalog as settings.json plus an append-only patch log
+"""
+import json
+import os
+import threading
+
+import streamlit as st
+
+import config
+from catalog import Catalog, CatalogError
+from utils import DEFAULT_SETTINGS, load_settings, create_directory_if_not_exists
+
+# Number of logged transactions after which the log is folded into settings.json
+CATALOG_LOG_COMPACT_AFTER = 500
+
+# Process-wide catalog snapshot shared by every session. A snapshot is
+# frozen and never modified; writes publish a new one (copy-on-write) and
+# bump the version, and a change to the files on disk triggers a reload.
+# settings_unreadable marks a settings.json that exists but could not be
+# read, so the catalog was built on the default settings. from_defaults
+# starts out the same and is cleared once a transaction commits.
+_catalog_snapshot = {
+    "version": 0, "signature": None, "catalog": None, "log_entries": 0,
+    "settings_unreadable": False, "from_defaults": False
+}
+_catalog_lock = threading.RLock()
+
+def _settings_path():
+    """Get the path of the catalog base snapshot"""
+    return config.settings_path()
+
+def _log_path():
+    """Get the path of the catalog patch log"""
+    return config.catalog_log_path()
+
+def _file_signature(path):
+    """Return a cheap fingerprint of a file"""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+def _store_signature():
+    """Return a fingerprint of the settings file and the patch log"""
+    return (_file_signature(_settings_path()), _file_signature(_log_path()))
+
+def _load_catalog():
+    """Load settings.json and replay the patch log on top of it"""
+    # A missing settings.json is written with the defaults, which is a
+    # first run; only one that exists and fails to load is unreadable
+    existed = _settings_path().exists()
+    settings = load_settings()
+    catalog = Catalog.from_settings(settings)
+    entries = 0
+
+    if _log_path().exists():
+        with open(_log_path(), "r") as f:
+            for line in f:
+                try:
+                    transaction = json.loads(line)
+                except ValueError:
+                    # A torn final line is a transaction that never committed
+                    break
+                entries += 1
+                for op in transaction.get("ops", []):
+                    try:
+                        catalog.apply(op)
+                    except CatalogError:
+                        # Already reflected in settings.json, or edited there since
+                        pass
+
+    catalog.journal = []
+    return catalog, entries, existed and settings is DEFAULT_SETTINGS
+
+def _publish_catalog(catalog, log_entries, from_defaults=None):
+    """Make a catalog the shared snapshot"""
+    if from_defaults is not None:
+        _catalog_snapshot["from_defaults"] = from_defaults
+    _catalog_snapshot["catalog"] = catalog.freeze()
+    _catalog_snapshot["signature"] = _store_signature()
+    _catalog_snapshot["log_entries"] = log_entries
+    _catalog_snapshot["version"] += 1
+
+def get_catalog():
+    """
+    Get the shared, read-only catalog snapshot
+
+    The catalog is loaded once per process and reloaded only when
+    settings.json or the patch log changes on disk. Use update_catalog or
+    the operations below to change it.
+    """
+    with _catalog_lock:
+        if _catalog_snapshot["catalog"] is None or _store_signature() != _catalog_snapshot["signature"]:
+            catalog, log_entries, unreadable = _load_catalog()
+            _catalog_snapshot["settings_unreadable"] = unreadable
+            _publish_catalog(catalog, log_entries, from_defaults=unreadable)
+        return _catalog_snapshot["catalog"]
+
+def get_catalog_version():
+    """Get the version of the current catalog snapshot"""
+    with _catalog_lock:
+        get_catalog()
+        return _catalog_snapshot["version"]
+
+def is_default_catalog():
+    """
+    Whether the catalog was built on the default settings because
+    settings.json could not be read, and has not been changed since
+    """
+    with _catalog_lock:
+        get_catalog()
+        return _catalog_snapshot["from_defaults"]
+
+def update_catalog(mutate):
+    """
+    Change the catalog in one transaction and publish it to every session
+
+    mutate receives a private, writable copy of the current catalog and edits
+    it in place; a CatalogError it raises leaves the catalog unchanged. The
+    operations it applied are appended to the patch log as a single line, so
+    a commit costs O(change) rather than a rewrite of settings.json.
+    """
+    with _catalog_lock:
+        catalog = get_catalog().copy()
+        mutate(catalog)
+        if not catalog.journal:
+            return True
+
+        try:
+            create_directory_if_not_exists(_log_path().parent)
+            with open(_log_path(), "a") as f:
+                f.write(json.dumps({"ops": catalog.journal}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            st.error(f"Error saving catalog: {e}")
+            return False
+
+        catalog.journal = []
+        # A logged change is one made on purpose, whatever it was built on
+        _publish_catalog(catalog, _catalog_snapshot["log_entries"] + 1, from_defaults=False)
+
+        if _catalog_snapshot["log_entries"] >= CATALOG_LOG_COMPACT_AFTER:
+            compact_catalog()
+        return True
+
+def compact_catalog():
+    """Fold the patch log into settings.json and start a new log"""
+    with _catalog_lock:
+        catalog = get_catalog()
+        # Folding would replace a settings.json that could not be read with
+        # the defaults; the log keeps the changes until it is fixed
+        if is_default_catalog() or _catalog_snapshot["settings_unreadable"]:
+            print("Not compacting the catalog: settings.json could not be read")
+            return False
+        settings_path = _settings_path()
+        temp_path = settings_path.with_name(settings_path.name + ".tmp")
+
+        try:
+            create_directory_if_not_exists(settings_path.parent)
+            with open(temp_path, "w") as f:
+                json.dump(catalog.to_settings(), f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, settings_path)
+
+            # Ops left in the log would be no-ops after the swap, so a crash
+            # between these two steps is harmless
+            with open(_log_path(), "w"):
+                pass
+        except Exception as e:
+            st.error(f"Error compacting catalog: {e}")
+            return False
+
+        _catalog_snapshot["signature"] = _store_signature()
+        _catalog_snapshot["log_entries"] = 0
+        return True
+
+# Catalog operations, each committed atomically
+
+def add_university(university):
+    """Add a university"""
+    return update_catalog(lambda c: c.add_university(university))
+
+def add_semester(university, semester):
+    """Add a semester to a university"""
+    return update_catalog(lambda c: c.add_semester(university, semester))
+
+def add_course(university, semester, course, resource_types=None):
+    """Add a course to a university semester"""
+    return update_catalog(lambda c: c.add_course(university, semester, course, resource_types))
+
+def remove_university(university):
+    """Remove a university with its semesters and courses"""
+    return update_catalog(lambda c: c.remove(university))
+
+def remove_semester(university, semester):
+    """Remove a semester with its courses"""
+    return update_catalog(lambda c: c.remove(university, semester))
+
+def remove_course(university, semester, course):
+    """Remove a course"""
+    return update_catalog(lambda c: c.remove(university, semester, course))
+
+def rename_university(university, new_name):
+    """Rename a university"""
+    return update_catalog(lambda c: c.rename((university,), new_name))
+
+def rename_semester(university, semester, new_name):
+    """Rename a semester"""
+    return update_catalog(lambda c: c.rename((university, semester), new_name))
+
+def rename_course(university, semester, course, new_name):
+    """Rename a course"""
+    return update_catalog(lambda c: c.rename((university, semester, course), new_name))
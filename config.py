@@ -0,0 +1,110 @@
+"""
+Storage configuration for the Student Resource Portal
+Resolves where the request store, the catalog and the uploads tree live
+
+Each location can be set by an environment variable or in a JSON config
+file, and defaults to a folder under the data root:
+
+    STUDYHUB_DATA_ROOT      data_root      default "data"
+    STUDYHUB_STORE_DIR      store_dir      requests, notifications, resource index and job queue
+    STUDYHUB_CATALOG_DIR    catalog_dir    settings.json and the catalog log
+    STUDYHUB_UPLOADS_DIR    uploads_dir    uploaded resources
+    STUDYHUB_QUARANTINE_DIR quarantine_dir orphaned uploads awaiting deletion
+    STUDYHUB_BLOBS_DIR      blobs_dir      upload contents stored once by SHA-256
+
+The config file is read from STUDYHUB_STORAGE_CONFIG, or storage.json in the
+working directory if it exists. Environment variables win over the file.
+Setting STUDYHUB_BENCHMARK=1 moves the data root to tmpfs (/dev/shm).
+STUDYHUB_MAX_UPLOAD_MB sets the largest file stored, 100 MB by default.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+CONFIG_FILE_ENV = "STUDYHUB_STORAGE_CONFIG"
+DEFAULT_CONFIG_FILE = "storage.json"
+BENCHMARK_DATA_ROOT = "/dev/shm/studyhub-benchmark"
+
+# Largest file stored. It applies to every file, including each entry of an
+# imported archive. Keep it below server.maxUploadSize in
+# .streamlit/config.toml, which limits one whole request (a single file or
+# an archive) and what Streamlit buffers for it.
+MAX_UPLOAD_BYTES = int(os.environ.get("STUDYHUB_MAX_UPLOAD_MB") or 100) * 1024 * 1024
+
+_config = {}
+_config_lock = threading.Lock()
+
+def _read_config_file():
+    """Read the optional JSON config file"""
+    config_path = os.environ.get(CONFIG_FILE_ENV, DEFAULT_CONFIG_FILE)
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, "r") as f:
+        return json.load(f)
+
+def get_storage_config():
+    """Get the resolved storage locations as a dict of Paths"""
+    with _config_lock:
+        if not _config:
+            file_config = _read_config_file()
+
+            def setting(name, default):
+                value = os.environ.get(f"STUDYHUB_{name.upper()}") or file_config.get(name)
+                return Path(value) if value else Path(default)
+
+            default_root = BENCHMARK_DATA_ROOT if os.environ.get("STUDYHUB_BENCHMARK") == "1" else "data"
+            data_root = setting("data_root", default_root)
+            uploads_dir = setting("uploads_dir", data_root / "uploads")
+            _config.update({
+                "data_root": data_root,
+                "store_dir": setting("store_dir", data_root),
+                "catalog_dir": setting("catalog_dir", data_root),
+                "uploads_dir": uploads_dir,
+                # Next to the uploads so quarantining a folder is a rename on one filesystem
+                "quarantine_dir": setting("quarantine_dir", uploads_dir.parent / "quarantine"),
+                # On the same filesystem too, so course folders can hard link blobs
+                "blobs_dir": setting("blobs_dir", uploads_dir.parent / "blobs")
+            })
+        return _config
+
+def reset_storage_config():
+    """Forget the resolved config so the next lookup reads it again"""
+    with _config_lock:
+        _config.clear()
+
+def requests_path():
+    """Path of the resource request store"""
+    return get_storage_config()["store_dir"] / "requests.json"
+
+def notifications_path():
+    """Path of the notification outbox"""
+    return get_storage_config()["store_dir"] / "notifications.json"
+
+def resource_index_path():
+    """Path of the resource metadata database"""
+    return get_storage_config()["store_dir"] / "resources.db"
+
+def thumbnail_jobs_path():
+    """Path of the thumbnail job queue"""
+    return get_storage_config()["store_dir"] / "thumbnail_jobs.db"
+
+def settings_path():
+    """Path of the catalog base snapshot"""
+    return get_storage_config()["catalog_dir"] / "settings.json"
+
+def catalog_log_path():
+    """Path of the catalog patch log"""
+    return get_storage_config()["catalog_dir"] / "catalog.log"
+
+def uploads_dir():
+    """Root folder of uploaded resources"""
+    return get_storage_config()["uploads_dir"]
+
+def quarantine_dir():
+    """Folder holding orphaned uploads until they are deleted"""
+    return get_storage_config()["quarantine_dir"]
+
+def blobs_dir():
+    """Folder holding upload contents by SHA-256"""
+    return get_storage_config()["blobs_dir"]
@@ -0,0 +1,123 @@
+"""
+File downloads for the Student Resource Portal
+Serves uploaded files from an HTTP endpoint on the Streamlit server
+
+Files are streamed from disk in chunks with Range, ETag and Last-Modified
+support, so the browse tabs only emit plain links and a page view costs
+nothing per file until someone clicks one.
+"""
+import gc
+import os
+import threading
+from urllib.parse import quote
+
+import streamlit as st
+
+from config import uploads_dir
+
+try:
+    import tornado.web
+except ImportError:
+    # Streamlit releases that no longer run on Tornado
+    tornado = None
+
+# Path of the endpoint under the app's base URL
+DOWNLOAD_URL_PREFIX = "download"
+
+# Oldest Streamlit release whose Tornado server the route is added to. Newer
+# releases are checked for the same internals before anything is changed.
+MIN_STREAMLIT_VERSION = (1, 43)
+
+if tornado is not None:
+    class ResourceDownloadHandler(tornado.web.StaticFileHandler):
+        """Stream a file from the uploads folder"""
+
+        def compute_etag(self):
+            # The default hashes the whole file; size and mtime identify a
+            # version just as well and cost one stat
+            stat = os.stat(self.absolute_path)
+            return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+        def set_extra_headers(self, path):
+            file_name = os.path.basename(path)
+            self.set_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(file_name)}")
+            self.set_header("X-Content-Type-Options", "nosniff")
+            # Let browsers keep the file but check it with the ETag before reuse
+            self.set_header("Cache-Control", "private, no-cache")
+
+        def get_content_type(self):
+            content_type = super().get_content_type()
+            # Never let a browser render an uploaded HTML or script file in the app's origin
+            if content_type.startswith(("text/html", "application/javascript", "image/svg")):
+                return "application/octet-stream"
+            return content_type
+
+# Whether the endpoint is mounted in this process, None until first tried,
+# and why not when it is not
+_mount_state = {"mounted": None, "reason": None}
+_mount_lock = threading.Lock()
+
+def _streamlit_version():
+    """The running Streamlit release as a (major, minor) tuple"""
+    try:
+        return tuple(int(part) for part in st.__version__.split(".")[:2])
+    except (AttributeError, ValueError):
+        return (0, 0)
+
+def _find_tornado_app():
+    """Find the Tornado application serving Streamlit in this process"""
+    for obj in gc.get_objects():
+        if isinstance(obj, tornado.web.Application):
+            return obj
+    return None
+
+def _mount_refusal():
+    """Reason the endpoint cannot be added to this server, or None with the app"""
+    if tornado is None:
+        return "this Streamlit release does not run on Tornado", None
+    if _streamlit_version() < MIN_STREAMLIT_VERSION:
+        return f"Streamlit {st.__version__} is older than supported", None
+    app = _find_tornado_app()
+    if app is None:
+        return "no Tornado server is running in this process", None
+    if not isinstance(getattr(getattr(app, "wildcard_router", None), "rules", None), list):
+        return "the Tornado server has no route list to add to", None
+    return None, app
+
+def mount_download_endpoint():
+    """
+    Add the download route to the Streamlit server, once per process
+
+    Streamlit has no API for extra routes, so the rule is put in front of
+    its catch-all route on the running Tornado application. Returns whether
+    the endpoint is available; callers fall back to inline downloads if not.
+    """
+    with _mount_lock:
+        if _mount_state["mounted"] is None:
+            _mount_state["mounted"] = False
+            reason, app = _mount_refusal()
+            if app is not None:
+                base = st.get_option("server.baseUrlPath").strip("/")
+                pattern = f"/{base}/{DOWNLOAD_URL_PREFIX}/(.*)" if base else f"/{DOWNLOAD_URL_PREFIX}/(.*)"
+                router = app.wildcard_router
+                rules = list(router.rules)
+                try:
+                    router.add_rules([(pattern, ResourceDownloadHandler, {"path": str(uploads_dir())})])
+                    router.rules.insert(0, router.rules.pop())
+                    _mount_state["mounted"] = True
+                except Exception as e:
+                    router.rules[:] = rules
+                    reason = f"the route could not be added ({e})"
+                    print(f"Error mounting the download endpoint: {e}")
+            _mount_state["reason"] = reason
+        return _mount_state["mounted"]
+
+def get_download_status():
+    """Get whether downloads are served by the endpoint and, if not, why"""
+    with _mount_lock:
+        return {"mounted": _mount_state["mounted"], "reason": _mount_state["reason"]}
+
+def download_url(file_path):
+    """URL of a file in the uploads folder, relative to the app page"""
+    relative = os.path.relpath(file_path, uploads_dir())
+    return f"{DOWNLOAD_URL_PREFIX}/{quote(relative)}"
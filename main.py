@@ -16,16 +16,22 @@ os.environ['STREAMLIT_SERVER_PORT'] = '8501'
 import pandas as pd
 import os
 import json
-import base64
 from datetime import datetime
-from pathlib import Path
 import shutil
 from PIL import Image
 import io
+import uuid
 
-from utils import load_settings, save_settings, get_file_path, create_directory_if_not_exists, validate_email
+from utils import validate_email
 from admin import show_admin_panel
-from models import ResourceRequest, add_request, load_requests
+from catalog_store import get_catalog
+from downloads import download_url, mount_download_endpoint
+from resources import list_resources
+from search import get_course_search_index
+from thumbnails import get_thumbnail_url, is_image, start_thumbnail_worker
+from storage import start_upload_gc
+from watcher import start_resource_watcher
+from models import ResourceRequest, add_request, load_requests, get_open_request_count
 
 # Custom CSS to match the design in the example
 st.markdown("""
@@ -158,6 +164,16 @@ st.markdown("""
         background-color: #F44336;
         color: white;
     }
+    .waiting-badge {
+        background-color: #FFC107;
+        color: #000;
+        padding: 0.2rem 0.6rem;
+        border-radius: 10px;
+        font-size: 0.85rem;
+        font-weight: bold;
+        display: inline-block;
+        margin-bottom: 0.8rem;
+    }
     .request-card {
         background-color: #2D2D2D;
         border-radius: 5px;
@@ -171,8 +187,6 @@ st.markdown("""
 # Initialize session state if not already done
 if 'is_admin' not in st.session_state:
     st.session_state.is_admin = False
-if 'settings' not in st.session_state:
-    st.session_state.settings = load_settings()
 if 'show_request_form' not in st.session_state:
     st.session_state.show_request_form = False
 if 'my_requests_email' not in st.session_state:
@@ -180,11 +194,11 @@ if 'my_requests_email' not in st.session_state:
 if 'show_my_requests' not in st.session_state:
     st.session_state.show_my_requests = False
 
-# Create required directories
-data_dir = Path("data")
-uploads_dir = data_dir / "uploads"
-create_directory_if_not_exists(data_dir)
-create_directory_if_not_exists(uploads_dir)
+# Reclaim orphaned upload folders, follow changes made outside the app and
+# render thumbnails in the background, once per process
+start_upload_gc()
+start_resource_watcher()
+start_thumbnail_worker()
 
 # Main header
 st.markdown('<div class="main-header"><h1>Student Resource Portal</h1><p>Access past exams, study sheets, and helpful tips</p></div>', unsafe_allow_html=True)
@@ -250,30 +264,137 @@ with st.sidebar:
         else:
             st.error("Please enter a valid email address.")
 
-def file_download_link(file_path, file_name):
-    """Generate a download link for a file"""
-    with open(file_path, "rb") as f:
-        data = f.read()
-    b64 = base64.b64encode(data).decode()
-    file_size = os.path.getsize(file_path) / 1024  # Size in KB
+def file_download_link(file_path, file_name, size):
+    """
+    Generate a download link for a file, with its size in bytes from the resource index
+
+    Returns an empty string if the download endpoint is unavailable; show
+    show_download_button below the card instead.
+    """
+    if not mount_download_endpoint():
+        return ""
+    file_size = size / 1024  # Size in KB
+    # Streamed by the download endpoint only when clicked
+    return f'<a href="{download_url(file_path)}" download="{file_name}" class="download-btn">Download ({file_size:.1f} KB)</a>'
+
+def show_download_button(entry, key):
+    """
+    Lazy download control for installations without the download endpoint
+
+    A card first shows a button that hands out a one-shot download token.
+    Only the card holding the token reads its file, so a page costs nothing
+    per file until someone asks for one; the token is dropped once used.
+    """
+    if st.session_state.get("download_token") == key:
+        with open(entry["path"], "rb") as f:
+            data = f.read()
+        st.download_button(
+            f"Download ({entry['size'] / 1024:.1f} KB)",
+            data,
+            file_name=entry["name"],
+            mime=entry["mime"],
+            key=f"{key}_download",
+            on_click=lambda: st.session_state.pop("download_token", None)
+        )
+    elif st.button("Prepare Download", key=f"{key}_prepare"):
+        st.session_state.download_token = key
+        st.rerun()
+
+def show_file_card(entry, key_prefix):
+    """Show the card of one list_resources entry with its thumbnail and download control"""
+    file_name = entry["name"]
+    file_date = datetime.fromtimestamp(entry["mtime"]).strftime('%Y-%m-%d')
+    
+    # Create a file card with HTML for better layout control
+    file_html = '<div class="file-card">'
+    
+    # Add thumbnail container
+    file_html += '<div class="thumbnail-container">'
+    thumbnail = get_thumbnail_url(entry)
+    if thumbnail:
+        # For images, show a small cached thumbnail rather than the file itself
+        file_html += f'<img src="{thumbnail}" loading="lazy" style="max-width:100%; max-height:100px;" />'
+    elif is_image(entry):
+        # The thumbnail is still being made, show a placeholder
+        file_html += '<div class="file-icon">🖼️</div>'
+    elif file_name.lower().endswith(('.pdf')):
+        # For PDFs, show a PDF icon
+        file_html += '<div class="file-icon">📄</div>'
+    else:
+        # For other files show a generic file icon
+        file_html += '<div class="file-icon">📁</div>'
+    file_html += '</div>'
+    
+    # Add file name (shortened if needed)
     short_name = file_name
     if len(short_name) > 20:
-        # Truncate name if too long (for display)
         name_parts = os.path.splitext(file_name)
         short_name = name_parts[0][:17] + "..." + name_parts[1]
-    return f'<a href="data:application/octet-stream;base64,{b64}" download="{file_name}" class="download-btn">Download ({file_size:.1f} KB)</a>'
+    file_html += f'<div class="file-name">{short_name}</div>'
+    
+    # Add download button
+    download_link = file_download_link(entry["path"], file_name, entry["size"])
+    file_html += download_link
+    
+    # Add upload date
+    file_html += f'<div style="font-size:0.8rem; text-align:center; margin-top:0.5rem;">Uploaded: {file_date}</div>'
+    
+    # Close file card
+    file_html += '</div>'
+    
+    # Output the HTML
+    st.markdown(file_html, unsafe_allow_html=True)
+    if not download_link:
+        show_download_button(entry, f"{key_prefix}_{entry['path']}")
+
+def show_waiting_badge(university, semester, course, resource_type, label):
+    """Show how many students are waiting on a resource for a course"""
+    waiting = get_open_request_count(university, semester, course, resource_type)
+    if waiting:
+        students = "student" if waiting == 1 else "students"
+        st.markdown(f'<span class="waiting-badge">{waiting} {students} waiting for {label}</span>', unsafe_allow_html=True)
+
+def show_course_search(search_key, uni_key, semester_key, course_key):
+    """Search box that fills the university, semester and course selectboxes"""
+    query = st.text_input(
+        "Search courses",
+        key=search_key,
+        placeholder="Search courses across all universities and semesters...",
+        label_visibility="collapsed"
+    )
+    if not query:
+        return
+    
+    matches = get_course_search_index().search(query, limit=10)
+    if not matches:
+        st.caption("No matching courses found.")
+        return
+    
+    for i, (university, semester, course) in enumerate(matches):
+        if st.button(f"{course} · {university}, {semester}", key=f"{search_key}_match_{i}"):
+            # The selectboxes are rendered after this, so their state can be set directly
+            st.session_state[uni_key] = university
+            st.session_state[semester_key] = semester
+            st.session_state[course_key] = course
 
 def show_resource_request_form():
     """Display the resource request form"""
     st.markdown('<div class="resource-section"><h2 class="resource-header">Request a Resource</h2>', unsafe_allow_html=True)
     
-    settings = st.session_state.settings
+    catalog = get_catalog()
+    
+    # Each form instance gets its own idempotency key so double clicks and
+    # racing reruns cannot store the same request twice
+    if 'req_form_token' not in st.session_state:
+        st.session_state.req_form_token = uuid.uuid4().hex
+    
+    show_course_search("req_course_search", "req_university", "req_semester", "req_course")
     
     # Create three columns for university, semester, and course selection
     col1, col2, col3 = st.columns(3)
     
     # University selection
-    universities = settings.get("universities", [])
+    universities = catalog.universities()
     if not universities:
         st.warning("No universities available. Admin needs to add universities.")
         st.markdown('</div>', unsafe_allow_html=True)
@@ -284,7 +405,7 @@ def show_resource_request_form():
         selected_uni = st.selectbox("University", universities, key="req_university", label_visibility="collapsed")
     
     # Semester selection
-    semesters = settings.get("semesters", {}).get(selected_uni, [])
+    semesters = catalog.semesters(selected_uni)
     if not semesters:
         st.warning(f"No semesters available for {selected_uni}. Admin needs to add semesters.")
         st.markdown('</div>', unsafe_allow_html=True)
@@ -295,7 +416,7 @@ def show_resource_request_form():
         selected_semester = st.selectbox("Semester", semesters, key="req_semester", label_visibility="collapsed")
     
     # Course selection
-    courses = settings.get("courses", {}).get(f"{selected_uni}_{selected_semester}", [])
+    courses = catalog.courses(selected_uni, selected_semester)
     if not courses:
         st.warning(f"No courses available for {selected_uni}, {selected_semester}. Admin needs to add courses.")
         st.markdown('</div>', unsafe_allow_html=True)
@@ -306,7 +427,7 @@ def show_resource_request_form():
         selected_course = st.selectbox("Course", courses, key="req_course", label_visibility="collapsed")
     
     # Resource type
-    resource_types = ["Exams", "Study Sheets", "Tips & Notes"]
+    resource_types = catalog.resource_types(selected_uni, selected_semester, selected_course)
     col4, col5 = st.columns(2)
     
     with col4:
@@ -327,6 +448,22 @@ def show_resource_request_form():
             label_visibility="collapsed"
         )
     
+    # Show matching files that are already available before accepting a request
+    available = list_resources(selected_uni, selected_semester, selected_course, selected_resource_type)
+    if available:
+        st.info(f"{len(available)} {selected_resource_type.lower()} file(s) for {selected_course} are already available. "
+                "You can download them below or still submit a request if you need something different.")
+        if mount_download_endpoint():
+            links_html = '<div class="file-container">'
+            for entry in available:
+                links_html += f'<div class="file-card"><div class="file-name">{entry["name"]}</div>{file_download_link(entry["path"], entry["name"], entry["size"])}</div>'
+            links_html += '</div>'
+            st.markdown(links_html, unsafe_allow_html=True)
+        else:
+            for entry in available:
+                st.write(entry["name"])
+                show_download_button(entry, f"available_{entry['path']}")
+    
     # Description
     st.markdown("<p>Describe the resource you need</p>", unsafe_allow_html=True)
     description = st.text_area(
@@ -374,10 +511,18 @@ def show_resource_request_form():
             priority=selected_priority
         )
         
-        if add_request(request):
-            st.success("Your request has been submitted successfully! We'll notify you when it's processed.")
+        # Identical open requests are merged into one with a vote count
+        joins_existing = get_open_request_count(*request.key) > 0
+        if add_request(request, coalesce=True, idempotency_key=st.session_state.req_form_token):
+            # Shown on the page the form returns to
+            if joins_existing:
+                st.session_state.request_message = ("Someone has already requested this resource, so you were added "
+                                                    "as a supporter of that request. We'll notify you when it's processed.")
+            else:
+                st.session_state.request_message = "Your request has been submitted successfully! We'll notify you when it's processed."
             # Clear the form by resetting session state
             st.session_state.show_request_form = False
+            st.session_state.pop('req_form_token', None)
             st.rerun()
         else:
             st.error("Failed to submit your request. Please try again.")
@@ -385,6 +530,7 @@ def show_resource_request_form():
     # Cancel button
     if st.button("Cancel", key="cancel_request_btn"):
         st.session_state.show_request_form = False
+        st.session_state.pop('req_form_token', None)
         st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
@@ -402,8 +548,8 @@ def show_my_requests():
     # Load all requests
     all_requests = load_requests()
     
-    # Filter requests by email
-    my_requests = [req for req in all_requests if req.email.lower() == email.lower()]
+    # Filter requests by email, including requests the user voted for
+    my_requests = [req for req in all_requests if req.has_requester(email)]
     
     if not my_requests:
         st.info("You don't have any submitted requests yet.")
@@ -430,6 +576,7 @@ def show_my_requests():
                 <p><strong>Description:</strong> {req.description}</p>
                 <p><strong>Submitted:</strong> {req.created_at[:10]}</p>
                 <p><strong>Priority:</strong> {req.priority}</p>
+                <p><strong>Students asking:</strong> {req.vote_count}</p>
             """, unsafe_allow_html=True)
             
             # Show admin notes if available and not empty
@@ -453,7 +600,7 @@ def show_my_requests():
 
 def main():
     # Main content
-    settings = st.session_state.settings
+    catalog = get_catalog()
     
     # If admin is logged in, show admin panel
     if st.session_state.is_admin:
@@ -465,6 +612,9 @@ def main():
         show_resource_request_form()
         return
     
+    if 'request_message' in st.session_state:
+        st.success(st.session_state.pop('request_message'))
+    
     # If my requests should be shown
     if st.session_state.show_my_requests:
         show_my_requests()
@@ -473,11 +623,13 @@ def main():
     # Student view - Find Study Resources section
     st.markdown('<div class="resource-section"><h2 class="resource-header">Find Study Resources</h2>', unsafe_allow_html=True)
     
+    show_course_search("browse_course_search", "browse_university", "browse_semester", "browse_course")
+    
     # Create three columns for university, semester, and course selection
     col1, col2, col3 = st.columns(3)
     
     # University selection
-    universities = settings.get("universities", [])
+    universities = catalog.universities()
     if not universities:
         st.warning("No universities available. Admin needs to add universities.")
         st.markdown('</div>', unsafe_allow_html=True)
@@ -485,10 +637,10 @@ def main():
     
     with col1:
         st.markdown("<p>Select University</p>", unsafe_allow_html=True)
-        selected_uni = st.selectbox("University", universities, label_visibility="collapsed")
+        selected_uni = st.selectbox("University", universities, key="browse_university", label_visibility="collapsed")
     
     # Semester selection
-    semesters = settings.get("semesters", {}).get(selected_uni, [])
+    semesters = catalog.semesters(selected_uni)
     if not semesters:
         st.warning(f"No semesters available for {selected_uni}. Admin needs to add semesters.")
         st.markdown('</div>', unsafe_allow_html=True)
@@ -496,10 +648,10 @@ def main():
     
     with col2:
         st.markdown("<p>Select Semester</p>", unsafe_allow_html=True)
-        selected_semester = st.selectbox("Semester", semesters, label_visibility="collapsed")
+        selected_semester = st.selectbox("Semester", semesters, key="browse_semester", label_visibility="collapsed")
     
     # Course selection
-    courses = settings.get("courses", {}).get(f"{selected_uni}_{selected_semester}", [])
+    courses = catalog.courses(selected_uni, selected_semester)
     if not courses:
         st.warning(f"No courses available for {selected_uni}, {selected_semester}. Admin needs to add courses.")
         st.markdown('</div>', unsafe_allow_html=True)
@@ -507,7 +659,7 @@ def main():
     
     with col3:
         st.markdown("<p>Select Course</p>", unsafe_allow_html=True)
-        selected_course = st.selectbox("Course", courses, label_visibility="collapsed")
+        selected_course = st.selectbox("Course", courses, key="browse_course", label_visibility="collapsed")
     
     # Find Resources button
     btn_col1, btn_col2, btn_col3 = st.columns([2, 1, 2])
@@ -534,61 +686,19 @@ def main():
         # Define tabs for different resource types
         tab1, tab2, tab3 = st.tabs(["Past Exams", "Study Sheets", "Tips & Guides"])
         
-        # Generate file path for resources
-        resource_path = get_file_path(selected_uni, selected_semester, selected_course)
-        create_directory_if_not_exists(resource_path)
-        
+        # Browsing is read-only and served from the resource index: folders are
+        # only created by admin writes, and a missing folder simply has no files
         # Display exams
         with tab1:
-            exam_path = resource_path / "exams"
-            create_directory_if_not_exists(exam_path)
+            show_waiting_badge(selected_uni, selected_semester, selected_course, "Exams", "exams")
             
-            exams = os.listdir(exam_path) if os.path.exists(exam_path) else []
+            exams = list_resources(selected_uni, selected_semester, selected_course, "Exams")
             if exams:
                 # Start file container
                 st.markdown('<div class="file-container">', unsafe_allow_html=True)
                 
-                for exam in exams:
-                    file_path = exam_path / exam
-                    file_date = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d')
-                    
-                    # Create a file card with HTML for better layout control
-                    file_html = '<div class="file-card">'
-                    
-                    # Add thumbnail container
-                    file_html += '<div class="thumbnail-container">'
-                    if exam.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                        # For images, convert to base64 to embed directly in HTML
-                        with open(file_path, "rb") as f:
-                            img_data = base64.b64encode(f.read()).decode()
-                        file_html += f'<img src="data:image/png;base64,{img_data}" style="max-width:100%; max-height:100px;" />'
-                    elif exam.lower().endswith(('.pdf')):
-                        # For PDFs, show a PDF icon
-                        file_html += '<div class="file-icon">📄</div>'
-                    else:
-                        # For other files show a generic file icon
-                        file_html += '<div class="file-icon">📁</div>'
-                    file_html += '</div>'
-                    
-                    # Add file name (shortened if needed)
-                    short_name = exam
-                    if len(short_name) > 20:
-                        name_parts = os.path.splitext(exam)
-                        short_name = name_parts[0][:17] + "..." + name_parts[1]
-                    file_html += f'<div class="file-name">{short_name}</div>'
-                    
-                    # Add download button
-                    download_link = file_download_link(file_path, exam)
-                    file_html += download_link
-                    
-                    # Add upload date
-                    file_html += f'<div style="font-size:0.8rem; text-align:center; margin-top:0.5rem;">Uploaded: {file_date}</div>'
-                    
-                    # Close file card
-                    file_html += '</div>'
-                    
-                    # Output the HTML
-                    st.markdown(file_html, unsafe_allow_html=True)
+                for entry in exams:
+                    show_file_card(entry, "exams")
                 
                 # Close file container
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -607,55 +717,15 @@ def main():
         
         # Display study sheets
         with tab2:
-            sheets_path = resource_path / "sheets"
-            create_directory_if_not_exists(sheets_path)
+            show_waiting_badge(selected_uni, selected_semester, selected_course, "Study Sheets", "study sheets")
             
-            sheets = os.listdir(sheets_path) if os.path.exists(sheets_path) else []
+            sheets = list_resources(selected_uni, selected_semester, selected_course, "Study Sheets")
             if sheets:
                 # Start file container
                 st.markdown('<div class="file-container">', unsafe_allow_html=True)
                 
-                for sheet in sheets:
-                    file_path = sheets_path / sheet
-                    file_date = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d')
-                    
-                    # Create a file card with HTML for better layout control
-                    file_html = '<div class="file-card">'
-                    
-                    # Add thumbnail container
-                    file_html += '<div class="thumbnail-container">'
-                    if sheet.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                        # For images, convert to base64 to embed directly in HTML
-                        with open(file_path, "rb") as f:
-                            img_data = base64.b64encode(f.read()).decode()
-                        file_html += f'<img src="data:image/png;base64,{img_data}" style="max-width:100%; max-height:100px;" />'
-                    elif sheet.lower().endswith(('.pdf')):
-                        # For PDFs, show a PDF icon
-                        file_html += '<div class="file-icon">📄</div>'
-                    else:
-                        # For other files show a generic file icon
-                        file_html += '<div class="file-icon">📁</div>'
-                    file_html += '</div>'
-                    
-                    # Add file name (shortened if needed)
-                    short_name = sheet
-                    if len(short_name) > 20:
-                        name_parts = os.path.splitext(sheet)
-                        short_name = name_parts[0][:17] + "..." + name_parts[1]
-                    file_html += f'<div class="file-name">{short_name}</div>'
-                    
-                    # Add download button
-                    download_link = file_download_link(file_path, sheet)
-                    file_html += download_link
-                    
-                    # Add upload date
-                    file_html += f'<div style="font-size:0.8rem; text-align:center; margin-top:0.5rem;">Uploaded: {file_date}</div>'
-                    
-                    # Close file card
-                    file_html += '</div>'
-                    
-                    # Output the HTML
-                    st.markdown(file_html, unsafe_allow_html=True)
+                for entry in sheets:
+                    show_file_card(entry, "sheets")
                 
                 # Close file container
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -674,55 +744,15 @@ def main():
         
         # Display tips and guides
         with tab3:
-            tips_path = resource_path / "tips"
-            create_directory_if_not_exists(tips_path)
+            show_waiting_badge(selected_uni, selected_semester, selected_course, "Tips & Notes", "tips")
             
-            tips = os.listdir(tips_path) if os.path.exists(tips_path) else []
+            tips = list_resources(selected_uni, selected_semester, selected_course, "Tips & Notes")
             if tips:
                 # Start file container
                 st.markdown('<div class="file-container">', unsafe_allow_html=True)
                 
-                for tip in tips:
-                    file_path = tips_path / tip
-                    file_date = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d')
-                    
-                    # Create a file card with HTML for better layout control
-                    file_html = '<div class="file-card">'
-                    
-                    # Add thumbnail container
-                    file_html += '<div class="thumbnail-container">'
-                    if tip.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-                        # For images, convert to base64 to embed directly in HTML
-                        with open(file_path, "rb") as f:
-                            img_data = base64.b64encode(f.read()).decode()
-                        file_html += f'<img src="data:image/png;base64,{img_data}" style="max-width:100%; max-height:100px;" />'
-                    elif tip.lower().endswith(('.pdf')):
-                        # For PDFs, show a PDF icon
-                        file_html += '<div class="file-icon">📄</div>'
-                    else:
-                        # For other files show a generic file icon
-                        file_html += '<div class="file-icon">📁</div>'
-                    file_html += '</div>'
-                    
-                    # Add file name (shortened if needed)
-                    short_name = tip
-                    if len(short_name) > 20:
-                        name_parts = os.path.splitext(tip)
-                        short_name = name_parts[0][:17] + "..." + name_parts[1]
-                    file_html += f'<div class="file-name">{short_name}</div>'
-                    
-                    # Add download button
-                    download_link = file_download_link(file_path, tip)
-                    file_html += download_link
-                    
-                    # Add upload date
-                    file_html += f'<div style="font-size:0.8rem; text-align:center; margin-top:0.5rem;">Uploaded: {file_date}</div>'
-                    
-                    # Close file card
-                    file_html += '</div>'
-                    
-                    # Output the HTML
-                    st.markdown(file_html, unsafe_allow_html=True)
+                for entry in tips:
+                    show_file_card(entry, "tips")
                 
                 # Close file container
                 st.markdown('</div>', unsafe_allow_html=True)
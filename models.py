@@ -4,11 +4,16 @@ Contains data structures and methods for resource requests
 """
 import json
 import os
+import heapq
+import threading
+import time
 from datetime import datetime
-from pathlib import Path
 import pandas as pd
 import streamlit as st
 
+from config import requests_path
+from utils import queue_notifications
+
 class ResourceRequest:
     """Model for a resource request"""
     
@@ -21,6 +26,14 @@ class ResourceRequest:
     PRIORITY_MEDIUM = "Medium"
     PRIORITY_HIGH = "High"
     
+    # Statuses that still need admin attention; new submissions can be
+    # coalesced into a request only while it is in one of these
+    OPEN_STATUSES = (STATUS_PENDING, STATUS_IN_PROGRESS)
+    
+    # Votes (requester plus supporters) at which a coalesced request is
+    # escalated to the given priority, checked from the highest threshold down
+    VOTE_PRIORITY_THRESHOLDS = [(10, PRIORITY_HIGH), (3, PRIORITY_MEDIUM)]
+    
     def __init__(self, 
                  university=None, 
                  semester=None, 
@@ -34,7 +47,8 @@ class ResourceRequest:
                  created_at=None,
                  updated_at=None,
                  request_id=None,
-                 admin_notes=None):
+                 admin_notes=None,
+                 supporters=None):
         """Initialize a resource request"""
         self.university = university
         self.semester = semester
@@ -49,6 +63,47 @@ class ResourceRequest:
         self.updated_at = updated_at or self.created_at
         self.request_id = request_id
         self.admin_notes = admin_notes or ""
+        self.supporters = supporters or []
+    
+    @property
+    def key(self):
+        """Key identifying requests for the same course resource"""
+        return (self.university, self.semester, self.course, self.resource_type)
+    
+    @property
+    def vote_count(self):
+        """Number of students asking for this resource"""
+        return 1 + len(self.supporters)
+    
+    def is_open(self):
+        """Check whether the request still needs admin attention"""
+        return self.status in self.OPEN_STATUSES
+    
+    def has_requester(self, email):
+        """Check whether an email already requested or supported this resource"""
+        if not email:
+            return False
+        emails = [self.email or ""] + [s.get("email", "") for s in self.supporters]
+        return email.lower() in (e.lower() for e in emails)
+    
+    def add_supporter(self, email):
+        """Record another student's vote and escalate the priority if needed"""
+        if self.has_requester(email):
+            return False
+        
+        self.supporters.append({
+            "email": email,
+            "timestamp": datetime.now().isoformat()
+        })
+        
+        priority_rank = [self.PRIORITY_LOW, self.PRIORITY_MEDIUM, self.PRIORITY_HIGH]
+        for threshold, priority in self.VOTE_PRIORITY_THRESHOLDS:
+            if self.vote_count >= threshold:
+                # Votes only ever raise the priority an admin has set
+                if priority_rank.index(priority) > priority_rank.index(self.priority):
+                    self.priority = priority
+                break
+        return True
         
     def to_dict(self):
         """Convert request to dictionary for JSON serialization"""
@@ -65,7 +120,8 @@ class ResourceRequest:
             "created_at": self.created_at,
             "updated_at": self.updated_at,
             "request_id": self.request_id,
-            "admin_notes": self.admin_notes
+            "admin_notes": self.admin_notes,
+            "supporters": self.supporters
         }
     
     @classmethod
@@ -84,19 +140,98 @@ class ResourceRequest:
             created_at=data.get("created_at"),
             updated_at=data.get("updated_at"),
             request_id=data.get("request_id"),
-            admin_notes=data.get("admin_notes", "")
+            admin_notes=data.get("admin_notes", ""),
+            supporters=data.get("supporters", [])
         )
 
 
+# In-process index over the request store. It is built from the store once,
+# rebuilt only when the file changes outside this process, and otherwise kept
+# current by the write path so readers never need to scan the store.
+_request_index = {
+    "signature": None,
+    "open_counts": {},  # request key -> number of students waiting
+    "open_ids": {}  # request key -> ids of open requests, oldest first
+}
+_request_index_lock = threading.RLock()
+
+def _store_signature():
+    """Return a cheap fingerprint of the request store file"""
+    try:
+        stat = os.stat(requests_path())
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+def _index_add(req):
+    """Add an open request to the index"""
+    if not req.is_open():
+        return
+    counts = _request_index["open_counts"]
+    counts[req.key] = counts.get(req.key, 0) + req.vote_count
+    _request_index["open_ids"].setdefault(req.key, []).append(req.request_id)
+
+def _index_remove(req):
+    """Remove an open request from the index"""
+    if not req.is_open():
+        return
+    counts = _request_index["open_counts"]
+    counts[req.key] = counts.get(req.key, 0) - req.vote_count
+    if counts[req.key] <= 0:
+        counts.pop(req.key, None)
+    
+    ids = _request_index["open_ids"].get(req.key, [])
+    if req.request_id in ids:
+        ids.remove(req.request_id)
+    if not ids:
+        _request_index["open_ids"].pop(req.key, None)
+
+def _sync_request_index(requests=None):
+    """Rebuild the index if the store changed outside this process"""
+    with _request_index_lock:
+        signature = _store_signature()
+        if _request_index["signature"] is not None and _request_index["signature"] == signature:
+            return
+        
+        if requests is None:
+            requests = load_requests()
+        
+        _request_index["open_counts"] = {}
+        _request_index["open_ids"] = {}
+        for req in requests:
+            _index_add(req)
+        _request_index["signature"] = signature
+
+def _index_committed():
+    """Mark the index as matching the store after a write from this process"""
+    _request_index["signature"] = _store_signature()
+
+def _copy_request(req):
+    """Snapshot a request so its indexed state can be removed after edits"""
+    return ResourceRequest.from_dict(json.loads(json.dumps(req.to_dict())))
+
+def get_open_request_count(university, semester, course, resource_type):
+    """Get the number of students waiting on a course resource"""
+    with _request_index_lock:
+        _sync_request_index()
+        return _request_index["open_counts"].get((university, semester, course, resource_type), 0)
+
+def get_most_wanted(limit=10):
+    """Get the course resources with the most students waiting"""
+    with _request_index_lock:
+        _sync_request_index()
+        counts = _request_index["open_counts"]
+        return heapq.nlargest(limit, counts.items(), key=lambda item: item[1])
+
 def load_requests():
     """Load resource requests from JSON file"""
-    requests_path = Path("data/requests.json")
+    store_path = requests_path()
     
-    if not requests_path.exists():
+    if not store_path.exists():
         return []
     
     try:
-        with open(requests_path, "r") as f:
+        with open(store_path, "r") as f:
             requests_data = json.load(f)
             return [ResourceRequest.from_dict(req) for req in requests_data]
     except Exception as e:
@@ -105,65 +240,227 @@ def load_requests():
 
 def save_requests(requests):
     """Save resource requests to JSON file"""
-    requests_path = Path("data/requests.json")
+    store_path = requests_path()
     
     try:
         # Create directory if not exists
-        if not requests_path.parent.exists():
-            requests_path.parent.mkdir(parents=True)
+        if not store_path.parent.exists():
+            store_path.parent.mkdir(parents=True)
             
         requests_data = [req.to_dict() for req in requests]
         
-        with open(requests_path, "w") as f:
+        with open(store_path, "w") as f:
             json.dump(requests_data, f, indent=4)
         return True
     except Exception as e:
         st.error(f"Error saving requests: {e}")
         return False
 
-def add_request(request):
-    """Add a new resource request"""
-    requests = load_requests()
+def index_open_requests(requests):
+    """Build a hash index from request key to the oldest open request"""
+    index = {}
+    for req in requests:
+        if req.is_open() and req.key not in index:
+            index[req.key] = req
+    return index
+
+# How long an idempotency key is remembered after a successful submission
+IDEMPOTENCY_WINDOW_SECONDS = 600
+
+# Short-lived dedupe table: idempotency key -> (request id, time recorded)
+_recent_submissions = {}
+
+def _lookup_submission(idempotency_key):
+    """Find a request already stored under an idempotency key"""
+    now = time.monotonic()
+    for key, (_, recorded) in list(_recent_submissions.items()):
+        if now - recorded > IDEMPOTENCY_WINDOW_SECONDS:
+            _recent_submissions.pop(key, None)
     
-    # Generate a unique ID for the request if not already set
-    if not request.request_id:
-        # Use timestamp + count as ID
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        request.request_id = f"REQ-{timestamp}-{len(requests) + 1}"
+    entry = _recent_submissions.get(idempotency_key)
+    return entry[0] if entry else None
+
+def add_request(request, coalesce=False, idempotency_key=None):
+    """
+    Add a new resource request
     
-    requests.append(request)
-    return save_requests(requests)
+    With coalesce enabled, a submission matching an open request for the same
+    university, semester, course and resource type is recorded as a supporter
+    vote on that request instead of creating a new one. A repeated submission
+    with the same idempotency_key inside IDEMPOTENCY_WINDOW_SECONDS returns the
+    original request id without writing. Returns the id of the stored request,
+    or False if saving failed.
+    """
+    with _request_index_lock:
+        if idempotency_key:
+            original_id = _lookup_submission(idempotency_key)
+            if original_id:
+                request.request_id = original_id
+                return original_id
+        
+        request_id = _add_request(request, coalesce)
+        if request_id and idempotency_key:
+            _recent_submissions[idempotency_key] = (request_id, time.monotonic())
+        return request_id
+
+def _add_request(request, coalesce):
+    """Write a new request, or a supporter vote, to the store"""
+    with _request_index_lock:
+        requests = load_requests()
+        _sync_request_index(requests)
+        
+        if coalesce:
+            existing = index_open_requests(requests).get(request.key)
+            if existing:
+                request.request_id = existing.request_id
+                before = _copy_request(existing)
+                if not existing.add_supporter(request.email):
+                    # Already the requester or a supporter, nothing changes
+                    return existing.request_id
+                existing.updated_at = datetime.now().isoformat()
+                if not save_requests(requests):
+                    return False
+                _index_remove(before)
+                _index_add(existing)
+                _index_committed()
+                return existing.request_id
+        
+        # Generate a unique ID for the request if not already set
+        if not request.request_id:
+            # Use timestamp + count as ID
+            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            request.request_id = f"REQ-{timestamp}-{len(requests) + 1}"
+        
+        requests.append(request)
+        if not save_requests(requests):
+            return False
+        _index_add(request)
+        _index_committed()
+        return request.request_id
 
 def update_request(request_id, updates):
     """Update an existing resource request"""
-    requests = load_requests()
-    updated = False
-    
-    for i, req in enumerate(requests):
-        if req.request_id == request_id:
-            # Update the request
-            for key, value in updates.items():
-                setattr(req, key, value)
-            
-            # Update the updated_at timestamp
-            req.updated_at = datetime.now().isoformat()
-            updated = True
-            break
-    
-    if updated:
-        return save_requests(requests)
-    return False
+    with _request_index_lock:
+        requests = load_requests()
+        _sync_request_index(requests)
+        updated = None
+        
+        for i, req in enumerate(requests):
+            if req.request_id == request_id:
+                before = _copy_request(req)
+                
+                # Update the request
+                for key, value in updates.items():
+                    setattr(req, key, value)
+                
+                # Update the updated_at timestamp
+                req.updated_at = datetime.now().isoformat()
+                updated = req
+                break
+        
+        if updated and save_requests(requests):
+            _index_remove(before)
+            _index_add(updated)
+            _index_committed()
+            return True
+        return False
 
 def delete_request(request_id):
     """Delete a resource request"""
-    requests = load_requests()
-    initial_count = len(requests)
+    with _request_index_lock:
+        requests = load_requests()
+        _sync_request_index(requests)
+        removed = [req for req in requests if req.request_id == request_id]
+        
+        requests = [req for req in requests if req.request_id != request_id]
+        
+        if removed and save_requests(requests):
+            for req in removed:
+                _index_remove(req)
+            _index_committed()
+            return True
+        return False
+
+def fulfill_open_requests(university, semester, course, resource_type, admin_note):
+    """
+    Mark every open request for a course resource as completed
+    
+    Matching requests are found through the open-request index, so the store
+    is only read and rewritten (once, in bulk) when something matches. A
+    notification is queued for each requester and supporter. Returns the
+    fulfilled requests.
+    """
+    key = (university, semester, course, resource_type)
+    
+    with _request_index_lock:
+        _sync_request_index()
+        matching_ids = set(_request_index["open_ids"].get(key, []))
+        if not matching_ids:
+            return []
+        
+        requests = load_requests()
+        now = datetime.now().isoformat()
+        fulfilled = []
+        for req in requests:
+            if req.request_id in matching_ids and req.is_open():
+                fulfilled.append((_copy_request(req), req))
+                req.status = ResourceRequest.STATUS_COMPLETED
+                req.admin_notes = f"{req.admin_notes}\n{admin_note}".strip()
+                req.updated_at = now
+        
+        if not fulfilled or not save_requests(requests):
+            return []
+        
+        for before, after in fulfilled:
+            _index_remove(before)
+            _index_add(after)
+        _index_committed()
+    
+    notifications = []
+    for _, req in fulfilled:
+        recipients = [req.email] + [s.get("email") for s in req.supporters]
+        for recipient in recipients:
+            if recipient:
+                notifications.append({
+                    "recipient": recipient,
+                    "subject": f"Your {req.resource_type} request for {req.course} is ready",
+                    "message": admin_note
+                })
+    queue_notifications(notifications)
+    
+    return [req for _, req in fulfilled]
+
+def rename_request_references(old_path, new_path):
+    """
+    Point requests at a renamed university, semester or course
     
-    requests = [req for req in requests if req.request_id != request_id]
+    old_path and new_path are (university,), (university, semester) or
+    (university, semester, course) tuples. The store is rewritten once and the
+    open-request index is re-keyed in place. Returns the number of requests changed.
+    """
+    old_path, new_path = tuple(old_path), tuple(new_path)
+    fields = ["university", "semester", "course"][:len(old_path)]
     
-    if len(requests) < initial_count:
-        return save_requests(requests)
-    return False
+    with _request_index_lock:
+        requests = load_requests()
+        _sync_request_index(requests)
+        
+        changed = 0
+        for req in requests:
+            if tuple(getattr(req, field) for field in fields) == old_path:
+                for field, value in zip(fields, new_path):
+                    setattr(req, field, value)
+                changed += 1
+        
+        if not changed or not save_requests(requests):
+            return 0
+        
+        for name in ("open_counts", "open_ids"):
+            index = _request_index[name]
+            for key in [key for key in index if key[:len(old_path)] == old_path]:
+                index[new_path + key[len(old_path):]] = index.pop(key)
+        _index_committed()
+        return changed
 
 def get_request_stats():
     """Get statistics about resource requests"""
@@ -0,0 +1,381 @@
+"""
+Resource catalog for the Student Resource Portal
+Keeps a persistent index of uploaded files per course and resource type
+"""
+import hashlib
+import mimetypes
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from catalog_store import get_catalog, get_catalog_version
+from config import resource_index_path, uploads_dir
+from utils import get_file_path, create_directory_if_not_exists
+
+# Map resource type to its directory inside a course folder
+RESOURCE_TYPE_DIRS = {
+    "Exams": "exams",
+    "Study Sheets": "sheets",
+    "Tips & Notes": "tips"
+}
+
+# Bytes read at a time when hashing a file
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# SQLite index of every uploaded file. A folder is read from disk the first
+# time it is looked up and recorded in indexed_folders; after that the upload
+# and delete paths keep its rows current, so listing a folder is one query.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    path TEXT PRIMARY KEY,
+    university TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    course TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT,
+    mime TEXT
+);
+CREATE INDEX IF NOT EXISTS resources_by_folder
+    ON resources (university, semester, course, resource_type, name);
+CREATE TABLE IF NOT EXISTS indexed_folders (
+    university TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    course TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    PRIMARY KEY (university, semester, course, resource_type)
+);
+"""
+
+FOLDER_COLUMNS = "university = ? AND semester = ? AND course = ? AND resource_type = ?"
+
+# One connection per process, shared by every session under the lock
+_db = {"path": None, "conn": None}
+_db_lock = threading.RLock()
+
+# Upload folders the app is renaming. Their rows are re-keyed by the rename
+# itself, so reconciliation must not drop them while the folder is away from
+# its old path; started counts renames so a pass can tell one began mid-scan.
+_renames = {"active": set(), "started": 0}
+
+def _connection():
+    """Get the index connection, opening the database on first use"""
+    db_path = resource_index_path()
+    if _db["conn"] is None or _db["path"] != db_path:
+        create_directory_if_not_exists(db_path.parent)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _db.update(path=db_path, conn=conn)
+    return _db["conn"]
+
+def get_resource_dir(university, semester, course, resource_type):
+    """Get the directory holding a course's files of one resource type"""
+    return get_file_path(university, semester, course) / RESOURCE_TYPE_DIRS[resource_type]
+
+def _relative_path(key, name):
+    """Path of a file relative to the uploads folder, as stored in the index"""
+    return str((get_resource_dir(*key) / name).relative_to(uploads_dir()))
+
+def hash_file(file_path):
+    """Get the SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def guess_mime_type(file_name):
+    """Guess a file's MIME type from its name"""
+    return mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+
+def _row(key, name, stat, sha256=None):
+    """Build the column values for one file"""
+    return (_relative_path(key, name), *key, name, stat.st_size, stat.st_mtime, sha256, guess_mime_type(name))
+
+def _upsert(conn, rows):
+    """Insert or replace file rows"""
+    conn.executemany(
+        "INSERT OR REPLACE INTO resources "
+        "(path, university, semester, course, resource_type, name, size, mtime, sha256, mime) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+def _load_folder(conn, key):
+    """Read a folder that was never indexed from disk into the index"""
+    # Hashes are left empty here so a first look at a large folder stays a
+    # directory scan; the background reconciliation fills them in
+    rows = []
+    try:
+        with os.scandir(get_resource_dir(*key)) as it:
+            for entry in it:
+                if entry.is_file():
+                    rows.append(_row(key, entry.name, entry.stat()))
+    except FileNotFoundError:
+        pass
+    with conn:
+        _upsert(conn, rows)
+        conn.execute("INSERT OR IGNORE INTO indexed_folders VALUES (?, ?, ?, ?)", key)
+
+def _ensure_folder(conn, key):
+    """Index a folder on first use"""
+    if conn.execute(f"SELECT 1 FROM indexed_folders WHERE {FOLDER_COLUMNS}", key).fetchone() is None:
+        _load_folder(conn, key)
+
+def list_resources(university, semester, course, resource_type):
+    """
+    List the files available for a course resource type
+
+    Returns dicts with name, path, size (bytes), mtime, sha256 and mime,
+    sorted by name. Served from the index without touching the files.
+    """
+    key = (university, semester, course, resource_type)
+    root = uploads_dir()
+    with _db_lock:
+        conn = _connection()
+        _ensure_folder(conn, key)
+        rows = conn.execute(
+            f"SELECT path, name, size, mtime, sha256, mime FROM resources WHERE {FOLDER_COLUMNS} ORDER BY name",
+            key
+        ).fetchall()
+    return [dict(row, path=root / row["path"]) for row in rows]
+
+def list_indexed_images():
+    """List (path, sha256) for every indexed image, sha256 may be None"""
+    root = uploads_dir()
+    with _db_lock:
+        rows = _connection().execute("SELECT path, sha256 FROM resources WHERE mime LIKE 'image/%'").fetchall()
+    return [(root / row["path"], row["sha256"]) for row in rows]
+
+def list_indexed_files():
+    """List (path, sha256) for every indexed file, sha256 may be None"""
+    root = uploads_dir()
+    with _db_lock:
+        rows = _connection().execute("SELECT path, sha256 FROM resources").fetchall()
+    return [(root / row["path"], row["sha256"]) for row in rows]
+
+def get_storage_totals():
+    """
+    Sum up the indexed files
+
+    Returns a dict with files, bytes (counting every copy) and unique_bytes
+    (counting each content once; files not hashed yet count in full).
+    """
+    with _db_lock:
+        conn = _connection()
+        files, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM resources").fetchone()
+        unique = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM ("
+            "SELECT MAX(size) AS size FROM resources WHERE sha256 IS NOT NULL GROUP BY sha256 "
+            "UNION ALL SELECT size FROM resources WHERE sha256 IS NULL)"
+        ).fetchone()[0]
+    return {"files": files, "bytes": total, "unique_bytes": unique}
+
+def record_resource(university, semester, course, resource_type, file_name, sha256=None):
+    """Add or refresh a file in the index after it was written, returns its SHA-256"""
+    key = (university, semester, course, resource_type)
+    file_path = get_resource_dir(*key) / file_name
+    sha256 = sha256 or hash_file(file_path)
+    row = _row(key, file_name, os.stat(file_path), sha256)
+    with _db_lock:
+        conn = _connection()
+        _ensure_folder(conn, key)
+        with conn:
+            _upsert(conn, [row])
+    return sha256
+
+def record_resources(files):
+    """
+    Add or refresh many written files in the index in one transaction
+
+    files is a list of (university, semester, course, resource_type,
+    file name, sha256) tuples.
+    """
+    rows = []
+    keys = set()
+    for university, semester, course, resource_type, file_name, sha256 in files:
+        key = (university, semester, course, resource_type)
+        file_path = get_resource_dir(*key) / file_name
+        rows.append(_row(key, file_name, os.stat(file_path), sha256 or hash_file(file_path)))
+        keys.add(key)
+    with _db_lock:
+        conn = _connection()
+        for key in keys:
+            _ensure_folder(conn, key)
+        with conn:
+            _upsert(conn, rows)
+
+def forget_resource(university, semester, course, resource_type, file_name):
+    """Drop a file from the index after it was deleted"""
+    key = (university, semester, course, resource_type)
+    with _db_lock:
+        conn = _connection()
+        with conn:
+            conn.execute("DELETE FROM resources WHERE path = ?", (_relative_path(key, file_name),))
+
+def forget_in_index(path):
+    """Drop every indexed folder under a university, semester or course after it was removed"""
+    path = tuple(path)
+    where = " AND ".join(f"{column} = ?" for column in ["university", "semester", "course"][:len(path)])
+    with _db_lock:
+        conn = _connection()
+        with conn:
+            for table in ("resources", "indexed_folders"):
+                conn.execute(f"DELETE FROM {table} WHERE {where}", path)
+
+def forget_course(university, semester, course):
+    """Drop every indexed folder of a course after it was removed"""
+    forget_in_index((university, semester, course))
+
+def rename_in_index(old_path, new_path):
+    """Re-key indexed folders after a university, semester or course rename"""
+    old_path, new_path = tuple(old_path), tuple(new_path)
+    columns = ["university", "semester", "course"][:len(old_path)]
+    where = " AND ".join(f"{column} = ?" for column in columns)
+    with _db_lock:
+        conn = _connection()
+        rows = conn.execute(
+            f"SELECT path, university, semester, course, resource_type, name FROM resources WHERE {where}",
+            old_path
+        ).fetchall()
+        with conn:
+            for row in rows:
+                key = new_path + (row["university"], row["semester"], row["course"], row["resource_type"])[len(new_path):]
+                conn.execute(
+                    "UPDATE resources SET path = ?, university = ?, semester = ?, course = ?, resource_type = ? WHERE path = ?",
+                    (_relative_path(key, row["name"]), *key, row["path"])
+                )
+            assignments = ", ".join(f"{column} = ?" for column in columns)
+            conn.execute(f"UPDATE OR REPLACE indexed_folders SET {assignments} WHERE {where}", new_path + old_path)
+
+# Map from a resource folder, relative to the uploads folder, to its
+# (university, semester, course, resource_type) key, rebuilt per catalog version
+_folder_keys = {"version": None, "keys": {}}
+
+@contextmanager
+def folder_rename(*dirs):
+    """Mark upload folders as being renamed by the app for the duration of a block"""
+    with _db_lock:
+        _renames["active"].update(dirs)
+        _renames["started"] += 1
+    try:
+        yield
+    finally:
+        with _db_lock:
+            _renames["active"].difference_update(dirs)
+
+def is_renaming(path):
+    """Whether a path is at or below a folder the app is renaming"""
+    with _db_lock:
+        return any(path == folder or folder in path.parents for folder in _renames["active"])
+
+def folder_key(relative_dir):
+    """Get the key of a resource folder from its path relative to the uploads folder, or None"""
+    version = get_catalog_version()
+    with _db_lock:
+        if _folder_keys["version"] != version:
+            root = uploads_dir()
+            keys = {}
+            for path in get_catalog().iter_courses():
+                for resource_type in RESOURCE_TYPE_DIRS:
+                    key = path + (resource_type,)
+                    keys[str(get_resource_dir(*key).relative_to(root))] = key
+            _folder_keys.update(version=version, keys=keys)
+        return _folder_keys["keys"].get(str(relative_dir))
+
+def indexed_folders():
+    """List the keys of every folder in the index"""
+    with _db_lock:
+        return [tuple(row) for row in _connection().execute("SELECT * FROM indexed_folders")]
+
+def sync_resource_file(file_path):
+    """
+    Bring the index in line with one file after it changed on disk
+
+    Used for changes made outside the app and to fill in a missing hash. The
+    file is hashed only if its size or mtime differ from the index. Returns
+    its SHA-256, or None if it is gone or not in a known resource folder.
+    """
+    relative = os.path.relpath(file_path, uploads_dir())
+    key = folder_key(os.path.dirname(relative))
+    if key is None:
+        return None
+
+    name = os.path.basename(relative)
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        forget_resource(*key, name)
+        return None
+
+    with _db_lock:
+        known = _connection().execute(
+            "SELECT size, mtime, sha256 FROM resources WHERE path = ?", (relative,)
+        ).fetchone()
+    if known and known["sha256"] and (known["size"], known["mtime"]) == (stat.st_size, stat.st_mtime):
+        return known["sha256"]
+    sha256 = hash_file(file_path)
+    row = _row(key, name, stat, sha256)
+    with _db_lock:
+        conn = _connection()
+        with conn:
+            _upsert(conn, [row])
+    return sha256
+
+def reconcile_folder(key, pause=None):
+    """
+    Compare an indexed folder with the disk and fix the rows that differ
+
+    Files that are new, changed or still missing a hash are hashed and
+    written; rows for files that are gone are dropped. pause, if given, is
+    called after each file hashed so a caller can throttle the work. A
+    folder the app renamed during the pass is left alone. Returns the number
+    of rows written and removed.
+    """
+    resource_dir = get_resource_dir(*key)
+    with _db_lock:
+        renames_started = _renames["started"]
+        known = {
+            row["name"]: row
+            for row in _connection().execute(
+                f"SELECT name, size, mtime, sha256 FROM resources WHERE {FOLDER_COLUMNS}", key
+            )
+        }
+
+    rows = []
+    on_disk = set()
+    try:
+        with os.scandir(resource_dir) as it:
+            entries = [entry for entry in it if entry.is_file()]
+    except FileNotFoundError:
+        entries = []
+    for entry in entries:
+        on_disk.add(entry.name)
+        stat = entry.stat()
+        row = known.get(entry.name)
+        if row and row["sha256"] and (row["size"], row["mtime"]) == (stat.st_size, stat.st_mtime):
+            continue
+        try:
+            rows.append(_row(key, entry.name, stat, hash_file(entry.path)))
+        except FileNotFoundError:
+            on_disk.discard(entry.name)
+        if pause:
+            pause()
+
+    removed = [(_relative_path(key, name),) for name in known if name not in on_disk]
+    with _db_lock:
+        if _renames["started"] != renames_started or is_renaming(resource_dir):
+            # The scan may have seen the folder mid-rename; the rename re-keys
+            # its rows and the next pass picks up anything else
+            return 0, 0
+        conn = _connection()
+        with conn:
+            _upsert(conn, rows)
+            conn.executemany("DELETE FROM resources WHERE path = ?", removed)
+    return len(rows), len(removed)
@@ -0,0 +1,19 @@
+"""
+Import path fix for the Student Resource Portal's command line scripts
+
+The app modules live next to the legacy streamlit.py, which shadows the
+streamlit package when one of them is run as a script.
+"""
+import os
+import sys
+
+def prefer_installed_streamlit():
+    """
+    Search this folder last for imports, for modules run as scripts
+
+    A script's folder is first on sys.path, and streamlit.py here would
+    shadow the streamlit package. Call before importing anything that
+    imports Streamlit.
+    """
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or ".") != app_dir] + [app_dir]
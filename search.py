@@ -0,0 +1,143 @@
+"""
+Course search for the Student Resource Portal
+Prefix (trie) and fuzzy (trigram) matching over every course in the catalog
+"""
+import re
+import threading
+
+from catalog_store import get_catalog, get_catalog_version
+
+# Minimum share of the query's trigrams a fuzzy match must contain
+MIN_TRIGRAM_SCORE = 0.3
+
+# Upper bound on entries scored for one fuzzy query, to keep it sub-millisecond
+MAX_FUZZY_CANDIDATES = 500
+
+
+def _tokens(text):
+    """Split text into lowercase word tokens"""
+    return re.findall(r"\w+", text.lower())
+
+def _trigrams(text):
+    """Get the set of character trigrams of a text, padded at word edges"""
+    trigrams = set()
+    for token in _tokens(text):
+        padded = f"  {token} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+class CourseSearchIndex:
+    """
+    Search index over (university, semester, course) entries
+
+    Word prefixes are looked up in a trie whose nodes list the entries that
+    pass through them, so finding prefix candidates costs O(length of the
+    query). Queries with typos fall back to trigram overlap.
+    """
+
+    def __init__(self, catalog):
+        """Build the index from a catalog"""
+        self.entries = sorted(catalog.iter_courses(), key=lambda path: (path[2].lower(), path))
+        self.entry_tokens = []
+        self.entry_trigrams = []
+        self.trie = {}
+        self.trigrams = {}
+
+        for entry_id, (university, semester, course) in enumerate(self.entries):
+            tokens = set(_tokens(f"{course} {university} {semester}"))
+            self.entry_tokens.append(tokens)
+            for token in tokens:
+                node = self.trie
+                for char in token:
+                    node = node.setdefault(char, {})
+                    node.setdefault("", []).append(entry_id)
+
+            trigrams = _trigrams(course)
+            self.entry_trigrams.append(trigrams)
+            for trigram in trigrams:
+                self.trigrams.setdefault(trigram, []).append(entry_id)
+
+    def _prefix_hits(self, token):
+        """Get the entries with a word starting with token, in entry order"""
+        node = self.trie
+        for char in token:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get("", [])
+
+    def _prefix_matches(self, tokens, limit):
+        """Get up to limit entries with a word starting with every token"""
+        hit_lists = sorted((self._prefix_hits(token) for token in tokens), key=len)
+        others = [token for token in tokens if self._prefix_hits(token) is not hit_lists[0]]
+
+        # Walk the most selective list and check the other words per entry
+        results = []
+        last = None
+        for entry_id in hit_lists[0]:
+            if entry_id == last:
+                continue
+            last = entry_id
+            entry_tokens = self.entry_tokens[entry_id]
+            if all(any(t.startswith(token) for t in entry_tokens) for token in others):
+                results.append(entry_id)
+                if len(results) == limit:
+                    break
+        return results
+
+    def _fuzzy_matches(self, query, exclude, limit):
+        """Get up to limit entries ranked by the query trigrams they share"""
+        query_trigrams = _trigrams(query)
+        if not query_trigrams:
+            return []
+
+        # A match must share at least `needed` trigrams, so it has to contain
+        # one of the rarest len - needed + 1 of them; only those are scanned
+        needed = max(1, int(MIN_TRIGRAM_SCORE * len(query_trigrams) + 0.999))
+        by_rarity = sorted(query_trigrams, key=lambda t: len(self.trigrams.get(t, [])))
+        candidates = set()
+        for trigram in by_rarity[:len(by_rarity) - needed + 1]:
+            candidates.update(self.trigrams.get(trigram, [])[:MAX_FUZZY_CANDIDATES - len(candidates)])
+            if len(candidates) >= MAX_FUZZY_CANDIDATES:
+                break
+        candidates -= exclude
+
+        scored = []
+        for entry_id in candidates:
+            score = len(query_trigrams & self.entry_trigrams[entry_id])
+            if score >= needed:
+                scored.append((-score, entry_id))
+        scored.sort()
+        return [entry_id for _, entry_id in scored[:limit]]
+
+    def search(self, query, limit=10):
+        """
+        Find the best matching courses for a query
+
+        Returns up to limit (university, semester, course) tuples. Entries
+        matching every query word as a prefix come first, then fuzzy matches.
+        """
+        tokens = _tokens(query)
+        if not tokens:
+            return []
+
+        results = self._prefix_matches(tokens, limit)
+        if len(results) < limit:
+            results += self._fuzzy_matches(query, set(results), limit - len(results))
+
+        return [self.entries[entry_id] for entry_id in results]
+
+
+# One index per process, rebuilt only when the catalog version changes
+_search_index = {"version": None, "index": None}
+_search_index_lock = threading.Lock()
+
+def get_course_search_index():
+    """Get the course search index for the current catalog"""
+    with _search_index_lock:
+        version = get_catalog_version()
+        if _search_index["version"] != version:
+            _search_index["index"] = CourseSearchIndex(get_catalog())
+            _search_index["version"] = version
+        return _search_index["index"]
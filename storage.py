@@ -0,0 +1,579 @@
+"""
+Upload storage for the Student Resource Portal
+File and directory operations on the uploads tree
+"""
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from catalog_io import create_course_directories
+from catalog import CatalogError
+from config import MAX_UPLOAD_BYTES, blobs_dir, quarantine_dir
+from catalog_store import get_catalog, is_default_catalog, update_catalog
+from models import rename_request_references
+from resources import (
+    folder_rename, forget_course, get_storage_totals, is_renaming, list_indexed_files, rename_in_index, sync_resource_file
+)
+from utils import get_file_path, get_upload_dir, safe_path_name
+
+# ioctl request that clones a file's extents on copy-on-write filesystems (btrfs, XFS)
+FICLONE = 0x40049409
+
+# Threads used to clone files between course folders
+CLONE_WORKERS = 16
+
+# Bytes copied at a time when writing an upload. A stream read from disk or
+# from an archive entry then stays flat in memory however large it is. An
+# st.file_uploader upload is already held in memory by Streamlit, so for it
+# chunking only avoids a second full copy; server.maxUploadSize bounds that.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Threads writing a batch of uploads. Hashing and file writes release the
+# GIL, so a batch runs close to disk bandwidth.
+UPLOAD_WORKERS = 8
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload is larger than MAX_UPLOAD_BYTES"""
+
+# How long quarantined folders are kept before they are deleted
+GC_GRACE_PERIOD_SECONDS = 7 * 24 * 3600
+
+# Folders changed more recently than this are never treated as orphans, so
+# a rename or upload that is still in flight is left alone
+GC_MIN_ORPHAN_AGE_SECONDS = 3600
+
+# A pass that finds more than this share of the upload folders it looked at
+# orphaned quarantines nothing; that points at a broken catalog, not cleanup
+GC_MAX_ORPHAN_SHARE = 0.5
+
+# Seconds between background collection runs
+GC_INTERVAL_SECONDS = 6 * 3600
+
+# The collector sleeps GC_THROTTLE_SLEEP seconds after every GC_THROTTLE_BATCH
+# filesystem entries it touches, so it never competes with serving requests
+GC_THROTTLE_BATCH = 200
+GC_THROTTLE_SLEEP = 0.05
+
+
+def clone_file(source, target):
+    """
+    Make target a copy of source without copying bytes where possible
+
+    A reflink is tried first (an independent copy sharing extents), then a
+    hard link, then a plain copy. Returns the method used.
+    """
+    try:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, target)
+        return "reflink"
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+
+    try:
+        os.link(source, target)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(source, target)
+        return "copy"
+
+def clone_tree(source_dir, target_dir):
+    """Clone every file under source_dir into target_dir, keeping existing files"""
+    pairs = []
+    for root, _, files in os.walk(source_dir):
+        target_root = os.path.join(target_dir, os.path.relpath(root, source_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            target = os.path.join(target_root, name)
+            if not os.path.exists(target):
+                pairs.append((os.path.join(root, name), target))
+
+    methods = {}
+    with ThreadPoolExecutor(max_workers=CLONE_WORKERS) as executor:
+        for method in executor.map(lambda pair: clone_file(*pair), pairs):
+            methods[method] = methods.get(method, 0) + 1
+    return methods
+
+def rollover_semester(university, source_semester, target_semester, carry_resources=False):
+    """
+    Copy a semester's course list to a new semester
+
+    The target semester and its courses are added in one catalog transaction;
+    courses it already has are left alone. With carry_resources, each course's
+    files are cloned forward as reflinks or hard links, so no bytes are copied
+    where the filesystem allows it. Returns a summary dict with the courses
+    added and the number of files cloned per method.
+    """
+    courses = get_catalog().courses(university, source_semester)
+    added = []
+
+    def add_courses(catalog):
+        if not catalog.get_id(university, target_semester):
+            catalog.add_semester(university, target_semester)
+        for course in courses:
+            if not catalog.get_id(university, target_semester, course):
+                resource_types = catalog.resource_types(university, source_semester, course)
+                catalog.add_course(university, target_semester, course, resource_types)
+                added.append(course)
+
+    if not update_catalog(add_courses):
+        return None
+
+    summary = {"courses": added, "files": {}}
+    create_course_directories([(university, target_semester, course) for course in added])
+    for course in courses:
+        target_path = get_file_path(university, target_semester, course)
+        source_path = get_file_path(university, source_semester, course)
+        if carry_resources and os.path.isdir(source_path):
+            for method, count in clone_tree(source_path, target_path).items():
+                summary["files"][method] = summary["files"].get(method, 0) + count
+        forget_course(university, target_semester, course)
+    return summary
+
+def rename_catalog_entry(path, new_name):
+    """
+    Rename a university, semester or course and move its upload folder
+
+    path is (university,), (university, semester) or (university, semester,
+    course). The folder is moved with a single os.rename, which is O(1) on
+    one filesystem, before the catalog change is committed; it is moved back
+    if the commit fails. Requests and the resource index are re-keyed in
+    place. Raises CatalogError if the rename is not possible.
+    """
+    path = tuple(path)
+    new_path = path[:-1] + (new_name,)
+    catalog = get_catalog()
+    if not catalog.get_id(*path):
+        raise CatalogError(f"{', '.join(path)} does not exist!")
+    if not new_name:
+        raise CatalogError("Please enter a new name!")
+    if catalog.get_id(*new_path):
+        raise CatalogError(f"{new_name} already exists!")
+
+    old_dir, new_dir = get_upload_dir(*path), get_upload_dir(*new_path)
+    # The watcher and reconciliation leave both folders alone until the index is re-keyed
+    with folder_rename(old_dir, new_dir):
+        moved = False
+        if old_dir != new_dir and os.path.isdir(old_dir):
+            if os.path.isdir(new_dir):
+                # An empty folder left over for the new name is fine to replace
+                try:
+                    os.rmdir(new_dir)
+                except OSError:
+                    raise CatalogError(f"The upload folder for {new_name} already exists and is not empty!")
+            os.makedirs(new_dir.parent, exist_ok=True)
+            os.rename(old_dir, new_dir)
+            moved = True
+
+        try:
+            committed = update_catalog(lambda c: c.rename(path, new_name))
+        except CatalogError:
+            committed = False
+        if not committed:
+            if moved:
+                os.rename(new_dir, old_dir)
+            raise CatalogError(f"Failed to rename {path[-1]}.")
+
+        rename_in_index(path, new_path)
+    rename_request_references(path, new_path)
+    return True
+
+
+# Blob store. Every upload's content is stored once under blobs/ab/<sha256>
+# and course folders hold hard links to it, so the same file in several
+# courses, or under several names, takes its space once. A blob whose only
+# link is its own has no references left and is collected by the GC.
+# Writers and the collector share this lock, so a blob is never deleted
+# while an upload is linking to it.
+_blob_lock = threading.Lock()
+
+def blob_path(sha256):
+    """Path of the blob holding some content"""
+    return blobs_dir() / sha256[:2] / sha256
+
+def link_blob(blob, target):
+    """
+    Point target at a blob, replacing any file there
+
+    The link is made under a temporary name and renamed into place, so
+    readers never see a missing or partial file and other links to the old
+    content are untouched. Falls back to a copy across filesystems.
+    """
+    temp_target = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        os.link(blob, temp_target)
+    except OSError:
+        shutil.copy2(blob, temp_target)
+    os.replace(temp_target, target)
+
+def _check_upload_size(size, max_bytes):
+    """Raise UploadTooLargeError if size is over the limit"""
+    if size > max_bytes:
+        raise UploadTooLargeError(f"Files can be at most {max_bytes // 1048576} MB.")
+
+def store_upload(stream, target, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Write an upload to target through the blob store, returns its SHA-256
+
+    The stream is copied to a temporary file in chunks and hashed on the
+    way, so the content is read once and never held whole in memory here.
+    If the blob store already has the content, the copy is dropped and
+    target links to the existing blob.
+    Raises UploadTooLargeError, before anything is written if the stream
+    reports its size, when the upload is over max_bytes.
+    """
+    _check_upload_size(getattr(stream, "size", 0), max_bytes)
+    os.makedirs(blobs_dir(), exist_ok=True)
+    digest = hashlib.sha256()
+    written = 0
+    fd, temp_path = tempfile.mkstemp(dir=blobs_dir(), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+                written += len(chunk)
+                _check_upload_size(written, max_bytes)
+                digest.update(chunk)
+                f.write(chunk)
+        sha256 = digest.hexdigest()
+        blob = blob_path(sha256)
+        os.makedirs(blob.parent, exist_ok=True)
+        with _blob_lock:
+            try:
+                # Claims the blob atomically if the content is new
+                os.link(temp_path, blob)
+            except FileExistsError:
+                pass
+            link_blob(blob, target)
+    finally:
+        os.remove(temp_path)
+    return sha256
+
+def store_uploads(uploads, on_progress=None, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Write many uploads through the blob store in parallel
+
+    uploads is a list of (stream, target) pairs; a stream may also be a
+    function returning one, called in the worker thread, so many sources
+    need not be open at once. Returns a list of (target, sha256, error) in
+    the same order, where error is a message for a file that could not be
+    written. on_progress(done, total) is called from the calling thread as
+    files finish, so it can update Streamlit widgets.
+    """
+    def store_one(stream, target):
+        if callable(stream):
+            with stream() as opened:
+                return store_upload(opened, target, max_bytes)
+        return store_upload(stream, target, max_bytes)
+
+    results = [None] * len(uploads)
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        futures = {
+            executor.submit(store_one, stream, target): i
+            for i, (stream, target) in enumerate(uploads)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            target = uploads[i][1]
+            try:
+                results[i] = (target, future.result(), None)
+            except Exception as e:
+                # One unreadable source must not fail the rest of the batch
+                results[i] = (target, None, str(e))
+            if on_progress:
+                on_progress(done, len(uploads))
+    return results
+
+def deduplicate_uploads(throttle=None):
+    """
+    Move files written before the blob store into it
+
+    Each indexed file is re-checked against the disk, then either becomes
+    the blob for its content or is replaced by a link to the existing blob.
+    Returns the number of files that now share a blob.
+    """
+    throttle = throttle or Throttle()
+    linked = 0
+    for file_path, _ in list_indexed_files():
+        sha256 = sync_resource_file(file_path)
+        throttle.tick()
+        if not sha256:
+            continue
+        blob = blob_path(sha256)
+        os.makedirs(blob.parent, exist_ok=True)
+        with _blob_lock:
+            try:
+                os.link(file_path, blob)
+                continue
+            except FileExistsError:
+                pass
+            except OSError as e:
+                print(f"Error adding {file_path} to the blob store: {e}")
+                continue
+            if not os.path.samefile(file_path, blob):
+                link_blob(blob, file_path)
+                linked += 1
+    return linked
+
+def collect_blobs(throttle=None):
+    """Delete blobs no course folder links to any more, returns bytes freed"""
+    throttle = throttle or Throttle()
+    freed = 0
+    if not blobs_dir().exists():
+        return freed
+
+    cutoff = time.time() - GC_MIN_ORPHAN_AGE_SECONDS
+    for root, _, files in os.walk(blobs_dir()):
+        for name in files:
+            path = os.path.join(root, name)
+            throttle.tick()
+            with _blob_lock:
+                try:
+                    stat = os.lstat(path)
+                    # Left-over temporary files from interrupted uploads go too
+                    if stat.st_nlink == 1 and stat.st_mtime < cutoff:
+                        os.remove(path)
+                        freed += stat.st_size
+                except OSError:
+                    pass
+    return freed
+
+def get_deduplication_report():
+    """Report the bytes saved by storing each upload's content once"""
+    totals = get_storage_totals()
+    totals["saved_bytes"] = totals["bytes"] - totals["unique_bytes"]
+    return totals
+
+
+class Throttle:
+    """Sleep briefly after every batch of filesystem operations"""
+
+    def __init__(self, batch=GC_THROTTLE_BATCH, sleep=GC_THROTTLE_SLEEP):
+        self.batch = batch
+        self.sleep = sleep
+        self.count = 0
+
+    def tick(self):
+        self.count += 1
+        if self.count % self.batch == 0:
+            time.sleep(self.sleep)
+
+def _tree_size(path, throttle):
+    """Total size in bytes of the files under a folder"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+            throttle.tick()
+    return total
+
+def _live_names(names):
+    """Map folder names of catalog entries, raw or sanitized, to the entry name"""
+    live = {}
+    for name in names:
+        live[name] = name
+        live[safe_path_name(name)] = name
+    return live
+
+def _live_children(catalog, path):
+    """Map the folder names of the catalog entries under a path to their names"""
+    if not path:
+        return _live_names(catalog.universities())
+    if len(path) == 1:
+        return _live_names(catalog.semesters(path[0]))
+    return _live_names(catalog.courses(path[0], path[1]))
+
+def _last_changed(path):
+    """Time a folder was last modified or renamed; a rename keeps the mtime but sets the ctime"""
+    stat = os.stat(path)
+    return max(stat.st_mtime, stat.st_ctime)
+
+def _scan_orphans(throttle):
+    """Find orphaned folders, returns them with the number of folders looked at"""
+    catalog = get_catalog()
+    orphans = []
+    scanned = 0
+    now = time.time()
+
+    def scan(folder, path):
+        nonlocal scanned
+        if len(path) == 3:
+            return
+        live = _live_children(catalog, path)
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return
+        for entry in entries:
+            throttle.tick()
+            if not entry.is_dir(follow_symlinks=False) or Path(entry.path) == quarantine_dir():
+                continue
+            scanned += 1
+            if entry.name in live:
+                scan(entry.path, path + (live[entry.name],))
+            elif now - _last_changed(entry.path) >= GC_MIN_ORPHAN_AGE_SECONDS:
+                orphans.append((Path(entry.path), _tree_size(entry.path, throttle)))
+
+    scan(get_upload_dir(), ())
+    return orphans, scanned
+
+def find_orphans(throttle=None):
+    """
+    Find upload folders with no matching catalog entry
+
+    Returns a list of (path, bytes) for the topmost orphaned folders; a
+    removed semester is reported once rather than per course.
+    """
+    return _scan_orphans(throttle or Throttle())[0]
+
+def _is_orphan(path):
+    """Check a folder against the current catalog right before it is moved"""
+    if is_renaming(path):
+        return False
+    try:
+        if time.time() - _last_changed(path) < GC_MIN_ORPHAN_AGE_SECONDS:
+            return False
+    except OSError:
+        return False
+    catalog = get_catalog()
+    names = ()
+    for part in path.relative_to(get_upload_dir()).parts:
+        live = _live_children(catalog, names)
+        if part not in live:
+            return True
+        names += (live[part],)
+    return False
+
+def quarantine_orphans(orphans):
+    """
+    Move orphaned folders into a timestamped quarantine folder
+
+    Each folder is checked against a fresh catalog first, so one renamed or
+    re-added since the scan stays where it is.
+    """
+    batch_dir = quarantine_dir() / datetime.now().strftime("%Y%m%dT%H%M%S")
+    uploads_dir = get_upload_dir()
+    moved = 0
+    for path, _ in orphans:
+        if not _is_orphan(path):
+            continue
+        target = batch_dir / path.relative_to(uploads_dir)
+        os.makedirs(target.parent, exist_ok=True)
+        try:
+            os.rename(path, target)
+            moved += 1
+        except OSError as e:
+            print(f"Error quarantining {path}: {e}")
+    return moved
+
+def _quarantine_refusal(orphans, scanned):
+    """Reason not to quarantine a pass's orphans, or None when it is safe"""
+    if is_default_catalog() or not get_catalog().universities():
+        return "the catalog is empty or was not loaded from settings.json"
+    if orphans and len(orphans) > GC_MAX_ORPHAN_SHARE * scanned:
+        return f"{len(orphans)} of {scanned} upload folders look orphaned"
+    return None
+
+def purge_quarantine(throttle=None):
+    """Delete quarantine batches older than the grace period, returns bytes freed"""
+    throttle = throttle or Throttle()
+    freed = 0
+    if not quarantine_dir().exists():
+        return freed
+
+    cutoff = time.time() - GC_GRACE_PERIOD_SECONDS
+    for batch in os.scandir(quarantine_dir()):
+        try:
+            created = datetime.strptime(batch.name, "%Y%m%dT%H%M%S").timestamp()
+        except ValueError:
+            continue
+        if created > cutoff:
+            continue
+
+        # Delete file by file so the throttle applies to large batches too
+        for root, dirs, files in os.walk(batch.path, topdown=False):
+            for name in files:
+                file_path = os.path.join(root, name)
+                try:
+                    freed += os.lstat(file_path).st_size
+                    os.remove(file_path)
+                except OSError:
+                    pass
+                throttle.tick()
+            for name in dirs:
+                try:
+                    os.rmdir(os.path.join(root, name))
+                except OSError:
+                    pass
+        try:
+            os.rmdir(batch.path)
+        except OSError:
+            pass
+    return freed
+
+def quarantine_report():
+    """Summarize quarantined batches as a list of (batch name, bytes)"""
+    if not quarantine_dir().exists():
+        return []
+    throttle = Throttle()
+    return [(batch.name, _tree_size(batch.path, throttle)) for batch in sorted(os.scandir(quarantine_dir()), key=lambda b: b.name)]
+
+def collect_upload_garbage():
+    """
+    Run one garbage collection pass over the uploads tree
+
+    Orphaned folders are quarantined, expired quarantine batches are
+    deleted and unreferenced blobs are collected. Nothing is quarantined
+    when the catalog looks broken. Returns a summary dict.
+    """
+    throttle = Throttle()
+    orphans, scanned = _scan_orphans(throttle)
+    refused = _quarantine_refusal(orphans, scanned)
+    if refused:
+        print(f"Not quarantining orphaned upload folders: {refused}")
+    summary = {
+        "orphans": len(orphans),
+        "reclaimable_bytes": sum(size for _, size in orphans),
+        "quarantined": 0 if refused else quarantine_orphans(orphans),
+        "refused": refused,
+        "freed_bytes": purge_quarantine(throttle),
+        "blob_freed_bytes": collect_blobs(throttle),
+        "finished_at": datetime.now().isoformat()
+    }
+    _gc_state["last_run"] = summary
+    return summary
+
+# State of the background collector, one per process
+_gc_state = {"thread": None, "last_run": None}
+_gc_lock = threading.Lock()
+
+def _gc_loop():
+    """Run the collector forever at a fixed interval"""
+    while True:
+        try:
+            collect_upload_garbage()
+        except Exception as e:
+            print(f"Error collecting upload garbage: {e}")
+        time.sleep(GC_INTERVAL_SECONDS)
+
+def start_upload_gc():
+    """Start the background collector if it is not running in this process"""
+    with _gc_lock:
+        if _gc_state["thread"] is None:
+            _gc_state["thread"] = threading.Thread(target=_gc_loop, name="upload-gc", daemon=True)
+            _gc_state["thread"].start()
+
+def get_last_gc_run():
+    """Get the summary of the last collection pass, or None"""
+    return _gc_state["last_run"]
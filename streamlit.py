@@ -10,6 +10,10 @@ import plotly.graph_objects as go
 from PIL import Image
 import io
 import shutil
+import tempfile
+
+import config
+from config import MAX_UPLOAD_BYTES
 
 # Page configuration
 st.set_page_config(
@@ -175,7 +179,7 @@ def create_directory_if_not_exists(directory_path):
 
 def load_settings():
     """Load settings from the settings.json file"""
-    settings_path = Path("data/settings.json")
+    settings_path = config.settings_path()
     
     if not settings_path.exists():
         create_directory_if_not_exists(settings_path.parent)
@@ -192,7 +196,7 @@ def load_settings():
 
 def save_settings(settings):
     """Save settings to the settings.json file"""
-    settings_path = Path("data/settings.json")
+    settings_path = config.settings_path()
     
     try:
         if not settings_path.parent.exists():
@@ -205,10 +209,41 @@ def save_settings(settings):
         st.error(f"Error saving settings: {e}")
         return False
 
+# Uploads are copied in chunks of this many bytes. Streamlit already holds
+# an upload in memory; chunking only avoids making a second copy.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def save_uploaded_file(uploaded_file, file_path):
+    """
+    Write an uploaded file to disk in chunks, returns True on success
+
+    The file is written to a temporary file next to file_path and moved into
+    place when complete, so readers never see a partial file. Shows an error
+    and returns False if the file is larger than config.MAX_UPLOAD_BYTES or
+    cannot be written.
+    """
+    if uploaded_file.size > MAX_UPLOAD_BYTES:
+        st.error(f"Files can be at most {MAX_UPLOAD_BYTES // 1048576} MB.")
+        return False
+    
+    # A unique name, so two sessions saving the same file do not share it
+    fd, temp_path = tempfile.mkstemp(dir=Path(file_path).parent, prefix=f".{Path(file_path).name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: uploaded_file.read(UPLOAD_CHUNK_SIZE), b""):
+                f.write(chunk)
+        os.replace(temp_path, file_path)
+        return True
+    except Exception as e:
+        st.error(f"Error saving {uploaded_file.name}: {e}")
+        return False
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
 def get_file_path(university, semester, course):
     """Generate a file path for a given university, semester, and course"""
-    base_path = Path("data/uploads")
-    return base_path / university / semester / course
+    return config.uploads_dir() / university / semester / course
 
 def format_datetime(iso_datetime):
     """Format ISO datetime string to readable format"""
@@ -302,7 +337,7 @@ class ResourceRequest:
 
 def load_requests():
     """Load resource requests from JSON file"""
-    requests_path = Path("data/requests.json")
+    requests_path = config.requests_path()
     
     if not requests_path.exists():
         return []
@@ -317,7 +352,7 @@ def load_requests():
 
 def save_requests(requests):
     """Save resource requests to JSON file"""
-    requests_path = Path("data/requests.json")
+    requests_path = config.requests_path()
     
     try:
         if not requests_path.parent.exists():
@@ -405,10 +440,7 @@ def get_request_stats():
     return stats
 
 # Create required directories
-data_dir = Path("data")
-uploads_dir = data_dir / "uploads"
-create_directory_if_not_exists(data_dir)
-create_directory_if_not_exists(uploads_dir)
+create_directory_if_not_exists(config.uploads_dir())
 
 # Initialize session state
 if 'settings' not in st.session_state:
@@ -618,10 +650,9 @@ def show_resources():
                     if uploaded_file:
                         # Save the uploaded file
                         file_path = exam_path / uploaded_file.name
-                        with open(file_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        st.success(f"Uploaded {uploaded_file.name} successfully!")
-                        st.rerun()
+                        if save_uploaded_file(uploaded_file, file_path):
+                            st.success(f"Uploaded {uploaded_file.name} successfully!")
+                            st.rerun()
         
         with tab2:
             study_path = resource_path / "study_sheets"
@@ -686,10 +717,9 @@ def show_resources():
                     if uploaded_file:
                         # Save the uploaded file
                         file_path = study_path / uploaded_file.name
-                        with open(file_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        st.success(f"Uploaded {uploaded_file.name} successfully!")
-                        st.rerun()
+                        if save_uploaded_file(uploaded_file, file_path):
+                            st.success(f"Uploaded {uploaded_file.name} successfully!")
+                            st.rerun()
         
         with tab3:
             tips_path = resource_path / "tips_guides"
@@ -754,10 +784,9 @@ def show_resources():
                     if uploaded_file:
                         # Save the uploaded file
                         file_path = tips_path / uploaded_file.name
-                        with open(file_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        st.success(f"Uploaded {uploaded_file.name} successfully!")
-                        st.rerun()
+                        if save_uploaded_file(uploaded_file, file_path):
+                            st.success(f"Uploaded {uploaded_file.name} successfully!")
+                            st.rerun()
 
 # Show compact request form
 def show_request_form():
@@ -1052,14 +1081,12 @@ def manage_requests():
                         
                         # Save the uploaded file
                         file_path = category_path / uploaded_file.name
-                        with open(file_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        
-                        # Update admin notes to include file info
-                        file_info = f"\n\nUploaded resource: {uploaded_file.name} (in {resource_category})"
-                        update_request(request_id, {"admin_notes": admin_notes + file_info})
-                        
-                        st.success(f"Request updated and resource uploaded successfully!")
+                        if save_uploaded_file(uploaded_file, file_path):
+                            # Update admin notes to include file info
+                            file_info = f"\n\nUploaded resource: {uploaded_file.name} (in {resource_category})"
+                            update_request(request_id, {"admin_notes": admin_notes + file_info})
+                            
+                            st.success(f"Request updated and resource uploaded successfully!")
                     elif success:
                         st.success("Request updated successfully!")
                     else:
@@ -0,0 +1,27 @@
+"""
+Shared fixtures for the Student Resource Portal tests
+
+Run from the repository root with `python -m pytest tests`.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# The app modules live in the repository root, next to streamlit.py, which
+# would shadow the streamlit package if the root came first on sys.path
+sys.path.insert(0, str(APP_DIR))
+from script_path import prefer_installed_streamlit
+prefer_installed_streamlit()
+from config import reset_storage_config
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    """Point every storage location at a fresh temporary data root"""
+    monkeypatch.setenv("STUDYHUB_DATA_ROOT", str(tmp_path))
+    reset_storage_config()
+    yield tmp_path
+    reset_storage_config()
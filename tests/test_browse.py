@@ -0,0 +1,78 @@
+"""Tests for the student browse tabs"""
+import builtins
+import os
+import threading
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+from conftest import APP_DIR
+
+# Background threads that read files by design; only the page itself is counted
+BACKGROUND_THREADS = {"thumbnail-dispatch", "resource-watcher", "resource-reconcile", "upload-gc"}
+
+
+
+@pytest.fixture
+def course(data_root):
+    """A course with images, which have no thumbnails yet, and PDFs in every resource type"""
+    from catalog_store import add_course, add_semester, add_university
+    from resources import RESOURCE_TYPE_DIRS, get_resource_dir
+
+    add_university("U")
+    add_semester("U", "S")
+    add_course("U", "S", "C")
+    for resource_type in RESOURCE_TYPE_DIRS:
+        folder = get_resource_dir("U", "S", "C", resource_type)
+        os.makedirs(folder)
+        for i in range(50):
+            Image.new("RGB", (32, 24), (i, 0, 0)).save(folder / f"scan_{i}.png")
+            (folder / f"notes_{i}.pdf").write_bytes(b"%PDF-1.4 " + bytes([i]))
+    return ("U", "S", "C")
+
+@pytest.fixture
+def page_opens(monkeypatch):
+    """Record the uploaded files the page opens"""
+    from config import uploads_dir
+
+    opened = []
+    real_open = builtins.open
+
+    def counting_open(file, *args, **kwargs):
+        if isinstance(file, (str, os.PathLike)) and threading.current_thread().name not in BACKGROUND_THREADS:
+            path = Path(file).resolve()
+            if uploads_dir().resolve() in path.parents:
+                opened.append(path)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", counting_open)
+    return opened
+
+def browse(course):
+    """Render the browse page with a course selected"""
+    at = AppTest.from_file(str(APP_DIR / "main.py"), default_timeout=60).run()
+    university, semester, course_name = course
+    at.selectbox(key="browse_university").select(university).run()
+    at.selectbox(key="browse_semester").select(semester).run()
+    at.selectbox(key="browse_course").select(course_name).run()
+    assert not at.exception
+    return at
+
+
+def test_browsing_a_course_opens_no_files(course, page_opens):
+    at = browse(course)
+    cards = " ".join(markdown.value for markdown in at.markdown).count('class="file-card"')
+    assert cards == 300
+    assert page_opens == []
+
+def test_preparing_a_download_opens_only_that_file(course, page_opens):
+    from downloads import mount_download_endpoint
+
+    if mount_download_endpoint():
+        pytest.skip("downloads are served by the endpoint, not read by the page")
+    at = browse(course)
+    prepare = [button for button in at.button if button.label == "Prepare Download"]
+    prepare[0].click().run()
+    assert len(set(page_opens)) == 1
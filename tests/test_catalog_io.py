@@ -0,0 +1,13 @@
+"""Tests for catalog import and export"""
+import io
+
+
+def test_import_csv_with_byte_order_mark(data_root):
+    from catalog_io import import_uploaded_file
+    from catalog_store import get_catalog
+
+    uploaded_file = io.BytesIO("university,semester,course\nU,S,C\n".encode("utf-8-sig"))
+    uploaded_file.name = "catalog.csv"
+    summary = import_uploaded_file(uploaded_file)
+    assert summary == {"added": 1, "skipped": 0, "errors": []}
+    assert get_catalog().get_id("U", "S", "C")
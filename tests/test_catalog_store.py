@@ -0,0 +1,28 @@
+"""Tests for the shared catalog store"""
+from config import settings_path
+
+
+def test_first_run_defaults_are_not_a_failed_load(data_root):
+    from catalog_store import is_default_catalog
+
+    assert not is_default_catalog()
+    assert settings_path().exists()
+
+def test_unreadable_settings_until_a_change_commits(data_root):
+    from catalog_store import add_university, is_default_catalog
+
+    settings_path().parent.mkdir(parents=True, exist_ok=True)
+    settings_path().write_text("{not json")
+    assert is_default_catalog()
+    assert add_university("U")
+    assert not is_default_catalog()
+
+def test_compaction_keeps_unreadable_settings(data_root):
+    from catalog_store import add_university, compact_catalog, get_catalog
+
+    settings_path().parent.mkdir(parents=True, exist_ok=True)
+    settings_path().write_text("{not json")
+    assert add_university("U")
+    assert not compact_catalog()
+    assert settings_path().read_text() == "{not json"
+    assert "U" in get_catalog().universities()
@@ -0,0 +1,89 @@
+"""Tests for writing uploads through the blob store"""
+import io
+import os
+import subprocess
+import sys
+import textwrap
+import tomllib
+
+import pytest
+
+from conftest import APP_DIR
+
+# A stream this large read whole would show up plainly in peak RSS
+LARGE_UPLOAD_BYTES = 1024 * 1024 * 1024
+
+# Peak RSS growth allowed while storing it: a few chunks plus allocator slack
+MAX_RSS_GROWTH_BYTES = 32 * 1024 * 1024
+
+PEAK_RSS_SCRIPT = textwrap.dedent("""
+    import resource, sys
+    from pathlib import Path
+    sys.path.append(sys.argv[1])
+    from storage import store_upload
+
+    source, target, size = sys.argv[2], Path(sys.argv[3]), int(sys.argv[4])
+    with open(source, "wb") as f:
+        f.truncate(size)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(source, "rb") as stream:
+        store_upload(stream, target, max_bytes=size)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print((after - before) * 1024)
+""")
+
+
+class UnsizedStream(io.RawIOBase):
+    """A stream of zeros that does not report its size up front"""
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self.remaining)
+        buffer[:count] = bytes(count)
+        self.remaining -= count
+        return count
+
+
+def test_store_upload_peak_rss_stays_flat(data_root):
+    source = data_root / "source.bin"
+    target = data_root / "target.bin"
+    # A fresh interpreter, so the peak is not left over from other tests
+    result = subprocess.run(
+        [sys.executable, "-c", PEAK_RSS_SCRIPT, str(APP_DIR), str(source), str(target), str(LARGE_UPLOAD_BYTES)],
+        capture_output=True, text=True, check=True, cwd=data_root, env=dict(os.environ)
+    )
+    growth = int(result.stdout.strip().splitlines()[-1])
+    assert target.stat().st_size == LARGE_UPLOAD_BYTES
+    assert growth < MAX_RSS_GROWTH_BYTES
+
+def test_oversize_upload_rejected_before_writing(data_root):
+    from storage import UploadTooLargeError, store_upload
+
+    stream = io.BytesIO(b"x" * 10)
+    stream.size = 11 * 1024 * 1024
+    with pytest.raises(UploadTooLargeError):
+        store_upload(stream, data_root / "target.bin", max_bytes=10 * 1024 * 1024)
+    assert stream.tell() == 0
+    assert not (data_root / "target.bin").exists()
+
+def test_oversize_stream_without_size_leaves_nothing(data_root):
+    from config import blobs_dir
+    from storage import UploadTooLargeError, store_upload
+
+    with pytest.raises(UploadTooLargeError):
+        store_upload(UnsizedStream(5 * 1024 * 1024), data_root / "target.bin", max_bytes=2 * 1024 * 1024)
+    assert not (data_root / "target.bin").exists()
+    assert not list(blobs_dir().rglob("*"))
+
+def test_upload_cap_is_below_the_server_limit():
+    from storage import MAX_UPLOAD_BYTES
+
+    with open(APP_DIR / ".streamlit" / "config.toml", "rb") as f:
+        server_limit_mb = tomllib.load(f)["server"]["maxUploadSize"]
+    # The app's own cap has to be the one that triggers, with a clear message
+    assert MAX_UPLOAD_BYTES < server_limit_mb * 1024 * 1024
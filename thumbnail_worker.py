@@ -0,0 +1,29 @@
+"""
+Thumbnail rendering for the Student Resource Portal
+Runs inside the thumbnail worker processes
+
+This module imports nothing from the app, so worker processes start
+quickly and never import Streamlit.
+"""
+import io
+
+from PIL import Image, ImageOps, features
+
+# Longest side of a thumbnail in pixels
+THUMBNAIL_SIZE = 200
+THUMBNAIL_QUALITY = 80
+
+THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION = ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+
+def render_thumbnail(file_path):
+    """Decode an image and encode a thumbnail of it, returns the bytes"""
+    with Image.open(file_path) as image:
+        image.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        # WebP keeps transparency, JPEG has none
+        keep_alpha = THUMBNAIL_FORMAT == "WEBP" and image.has_transparency_data
+        image = image.convert("RGBA" if keep_alpha else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+        return buffer.getvalue()
@@ -0,0 +1,389 @@
+"""
+Image thumbnails for the Student Resource Portal
+Small previews of uploaded images, cached on disk by content hash
+
+Thumbnails are rendered by a pool of worker processes fed from a
+persistent job queue, so decoding large scans never blocks a page. Until a
+thumbnail is ready the browse tabs show a placeholder.
+
+Usage:
+    python thumbnails.py benchmark [IMAGE_DIR] [WORKERS]
+"""
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+if __name__ == "__main__":
+    from script_path import prefer_installed_streamlit
+    prefer_installed_streamlit()
+
+from PIL import Image
+
+from config import thumbnail_jobs_path
+from resources import guess_mime_type, list_indexed_images, sync_resource_file
+from thumbnail_worker import THUMBNAIL_EXTENSION, render_thumbnail
+from utils import create_directory_if_not_exists
+
+# Thumbnails beyond this many bytes are evicted, least recently written first
+THUMBNAIL_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Streamlit serves the static folder next to the app (server.enableStaticServing)
+# at app/static, so the cache has to live inside it. File names are content
+# hashes, so a cached thumbnail never changes and browsers can keep it.
+THUMBNAIL_DIR = Path(__file__).parent / "static" / "thumbnails"
+THUMBNAIL_URL_PREFIX = "app/static/thumbnails"
+
+# Worker processes rendering thumbnails, set STUDYHUB_THUMBNAIL_WORKERS to
+# change it. One core is left for the app by default.
+THUMBNAIL_WORKERS = int(os.environ.get("STUDYHUB_THUMBNAIL_WORKERS") or max(1, (os.cpu_count() or 2) - 1))
+
+# Jobs are given up after this many failed renders
+THUMBNAIL_MAX_ATTEMPTS = 3
+
+# Seconds the dispatcher waits for new jobs before checking the queue again
+THUMBNAIL_POLL_SECONDS = 5
+
+# Names and sizes of cached thumbnails, read from disk once per process so
+# rendering a page does not stat every thumbnail
+_cache = {"files": None, "bytes": 0}
+_cache_lock = threading.Lock()
+
+def _cached_files():
+    """Get the name to size map of cached thumbnails, loading it on first use"""
+    if _cache["files"] is None:
+        files = {}
+        if THUMBNAIL_DIR.exists():
+            with os.scandir(THUMBNAIL_DIR) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        files[entry.name] = entry.stat().st_size
+        _cache.update(files=files, bytes=sum(files.values()))
+    return _cache["files"]
+
+def _evict():
+    """Delete the oldest thumbnails until the cache is under its size cap"""
+    if _cache["bytes"] <= THUMBNAIL_CACHE_MAX_BYTES:
+        return
+    entries = []
+    for name in _cache["files"]:
+        try:
+            entries.append((os.stat(THUMBNAIL_DIR / name).st_mtime, name))
+        except OSError:
+            entries.append((0, name))
+    # Trim to 90% of the cap so eviction does not run on every new thumbnail
+    target = THUMBNAIL_CACHE_MAX_BYTES * 0.9
+    for _, name in sorted(entries):
+        if _cache["bytes"] <= target:
+            break
+        try:
+            os.remove(THUMBNAIL_DIR / name)
+        except OSError:
+            pass
+        _cache["bytes"] -= _cache["files"].pop(name)
+
+def thumbnail_name(sha256):
+    """File name of the thumbnail for some content"""
+    return f"{sha256}.{THUMBNAIL_EXTENSION}"
+
+def thumbnail_url(sha256):
+    """URL of the thumbnail for some content"""
+    return f"{THUMBNAIL_URL_PREFIX}/{thumbnail_name(sha256)}"
+
+def is_thumbnail_cached(sha256):
+    """Check whether the thumbnail for some content is in the cache"""
+    with _cache_lock:
+        return thumbnail_name(sha256) in _cached_files()
+
+def store_thumbnail(sha256, data):
+    """Write thumbnail bytes into the cache"""
+    name = thumbnail_name(sha256)
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    temp_path = THUMBNAIL_DIR / f"{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, THUMBNAIL_DIR / name)
+    with _cache_lock:
+        files = _cached_files()
+        _cache["bytes"] += len(data) - files.get(name, 0)
+        files[name] = len(data)
+        _evict()
+
+def is_image(entry):
+    """Check whether a list_resources entry is an image that can get a thumbnail"""
+    return entry["mime"].startswith("image/")
+
+
+# Persistent job queue. One row per content hash, so the same image uploaded
+# to many courses is rendered once; a job is deleted when its thumbnail is
+# stored and kept with its attempt count when rendering keeps failing.
+# Images whose hash is not known yet wait in unhashed until the dispatcher
+# hashes them, so a page never reads a file to queue its thumbnail.
+_JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    queued_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS unhashed (
+    path TEXT PRIMARY KEY,
+    queued_at REAL NOT NULL
+);
+"""
+
+_jobs_db = {"path": None, "conn": None}
+_jobs_lock = threading.RLock()
+_jobs_ready = threading.Event()
+
+def _jobs_connection():
+    """Get the job queue connection, opening the database on first use"""
+    db_path = thumbnail_jobs_path()
+    if _jobs_db["conn"] is None or _jobs_db["path"] != db_path:
+        create_directory_if_not_exists(db_path.parent)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_JOBS_SCHEMA)
+        _jobs_db.update(path=db_path, conn=conn)
+    return _jobs_db["conn"]
+
+def queue_thumbnails(images):
+    """
+    Queue thumbnail jobs for (file path, sha256) pairs
+
+    Non-images and cached thumbnails are skipped. Content already queued
+    keeps its job, unless the job was given up or points at another path;
+    then it is queued afresh. Returns the number of jobs added or renewed.
+    """
+    now = time.time()
+    jobs = [
+        (sha256, str(file_path), now) for file_path, sha256 in images
+        if sha256 and guess_mime_type(str(file_path)).startswith("image/") and not is_thumbnail_cached(sha256)
+    ]
+    if not jobs:
+        return 0
+    with _jobs_lock:
+        conn = _jobs_connection()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO jobs (sha256, path, queued_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET path = excluded.path, attempts = 0, queued_at = excluded.queued_at "
+                "WHERE jobs.path != excluded.path OR jobs.attempts >= ?",
+                [job + (THUMBNAIL_MAX_ATTEMPTS,) for job in jobs]
+            )
+            added = conn.total_changes - before
+    if added:
+        _jobs_ready.set()
+    return added
+
+def queue_thumbnail(file_path, sha256):
+    """Queue the thumbnail job for one file"""
+    return queue_thumbnails([(file_path, sha256)]) > 0
+
+def _queue_unhashed(file_path):
+    """Queue an image whose hash is not known yet; the dispatcher hashes it"""
+    with _jobs_lock:
+        conn = _jobs_connection()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO unhashed (path, queued_at) VALUES (?, ?)", (str(file_path), time.time()))
+    _jobs_ready.set()
+
+def _hash_unhashed():
+    """Hash the images waiting in unhashed and queue their jobs"""
+    with _jobs_lock:
+        paths = [row[0] for row in _jobs_connection().execute("SELECT path FROM unhashed ORDER BY queued_at")]
+    for file_path in paths:
+        sha256 = sync_resource_file(file_path)
+        if sha256:
+            queue_thumbnail(file_path, sha256)
+        with _jobs_lock:
+            conn = _jobs_connection()
+            with conn:
+                conn.execute("DELETE FROM unhashed WHERE path = ?", (file_path,))
+
+def queue_thumbnail_backfill():
+    """Queue thumbnails for every indexed image without one, returns the jobs added"""
+    images = []
+    for file_path, sha256 in list_indexed_images():
+        # Images indexed before they were hashed are hashed here
+        images.append((file_path, sha256 or sync_resource_file(file_path)))
+    return queue_thumbnails(images)
+
+def get_thumbnail_queue_length():
+    """Number of thumbnail jobs waiting or being rendered"""
+    with _jobs_lock:
+        return _jobs_connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE attempts < ?", (THUMBNAIL_MAX_ATTEMPTS,)
+        ).fetchone()[0]
+
+def _next_jobs(limit, exclude):
+    """Get the oldest jobs that are not given up or already running"""
+    with _jobs_lock:
+        rows = _jobs_connection().execute(
+            "SELECT sha256, path FROM jobs WHERE attempts < ? ORDER BY queued_at LIMIT ?",
+            (THUMBNAIL_MAX_ATTEMPTS, limit + len(exclude))
+        ).fetchall()
+    return [row for row in rows if row[0] not in exclude][:limit]
+
+def _finish_job(sha256, file_path, future):
+    """Store a rendered thumbnail, or count a failed attempt"""
+    try:
+        store_thumbnail(sha256, future.result())
+    except Exception as e:
+        print(f"Error creating thumbnail for {file_path}: {e}")
+        with _jobs_lock:
+            conn = _jobs_connection()
+            with conn:
+                conn.execute("UPDATE jobs SET attempts = attempts + 1 WHERE sha256 = ?", (sha256,))
+        return
+    with _jobs_lock:
+        conn = _jobs_connection()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE sha256 = ?", (sha256,))
+
+
+def _worker_context():
+    """
+    Multiprocessing context for the worker pool
+
+    Workers are forked where possible. Spawned workers re-import the main
+    module, which under `streamlit run` is the Streamlit CLI with this folder
+    first on sys.path, so they would pick up streamlit.py instead. Forked
+    workers only ever run thumbnail_worker code.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+def _dispatch_loop():
+    """Feed queued jobs to the worker pool forever"""
+    try:
+        queue_thumbnail_backfill()
+    except Exception as e:
+        print(f"Error queueing thumbnail backfill: {e}")
+
+    running = {}
+    with ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS, mp_context=_worker_context()) as executor:
+        while True:
+            try:
+                _hash_unhashed()
+                # Keep each worker busy with one job and one waiting
+                free = THUMBNAIL_WORKERS * 2 - len(running)
+                if free > 0:
+                    running_hashes = {sha256 for sha256, _ in running.values()}
+                    for sha256, file_path in _next_jobs(free, running_hashes):
+                        running[executor.submit(render_thumbnail, file_path)] = (sha256, file_path)
+
+                if not running:
+                    _jobs_ready.wait(THUMBNAIL_POLL_SECONDS)
+                    _jobs_ready.clear()
+                    continue
+
+                done, _ = wait(running, timeout=THUMBNAIL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _finish_job(*running.pop(future), future)
+            except Exception as e:
+                print(f"Error dispatching thumbnail jobs: {e}")
+                time.sleep(THUMBNAIL_POLL_SECONDS)
+
+# State of the background dispatcher, one per process
+_worker_state = {"thread": None}
+_worker_lock = threading.Lock()
+
+def start_thumbnail_worker():
+    """Start the thumbnail worker pool if it is not running in this process"""
+    with _worker_lock:
+        if _worker_state["thread"] is None:
+            _worker_state["thread"] = threading.Thread(target=_dispatch_loop, name="thumbnail-dispatch", daemon=True)
+            _worker_state["thread"].start()
+
+# Images a page has queued in this process, so rendering queues each once
+# and does not revive a job that keeps failing on every page view
+_queued_from_pages = set()
+
+def get_thumbnail_url(entry):
+    """
+    Get the thumbnail URL for a list_resources entry
+
+    Returns None while the thumbnail is not ready, and queues it if the
+    upload did not. Never reads the file: an image not hashed yet is
+    queued by path and hashed by the dispatcher.
+    """
+    if not is_image(entry):
+        return None
+    sha256 = entry["sha256"]
+    if sha256 and is_thumbnail_cached(sha256):
+        return thumbnail_url(sha256)
+    queued = sha256 or str(entry["path"])
+    with _cache_lock:
+        if queued in _queued_from_pages:
+            return None
+        _queued_from_pages.add(queued)
+    if sha256:
+        queue_thumbnail(entry["path"], sha256)
+    else:
+        _queue_unhashed(entry["path"])
+    return None
+
+
+def _make_benchmark_images(folder, count=48, size=(4000, 3000)):
+    """Write phone-camera sized JPEGs to benchmark with"""
+    paths = []
+    for i in range(count):
+        path = Path(folder) / f"scan_{i}.jpg"
+        Image.effect_noise(size, 64).convert("RGB").save(path, quality=90)
+        paths.append(path)
+    return paths
+
+def benchmark_thumbnails(paths, workers=THUMBNAIL_WORKERS):
+    """
+    Render thumbnails for some images on a worker pool without storing them
+
+    Returns a summary dict with images, workers, seconds, images_per_second
+    and images_per_second_per_core.
+    """
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context()) as executor:
+        # Start every worker before timing
+        list(executor.map(time.sleep, [0] * workers))
+        started = time.perf_counter()
+        list(executor.map(render_thumbnail, paths, chunksize=max(1, len(paths) // (workers * 4))))
+        seconds = time.perf_counter() - started
+
+    return {
+        "images": len(paths),
+        "workers": workers,
+        "seconds": seconds,
+        "images_per_second": len(paths) / seconds,
+        "images_per_second_per_core": len(paths) / seconds / workers
+    }
+
+
+def main(argv):
+    """Command line entry point"""
+    if len(argv) < 2 or argv[1] != "benchmark" or len(argv) > 4:
+        print(__doc__.strip())
+        return 1
+
+    workers = int(argv[3]) if len(argv) > 3 else THUMBNAIL_WORKERS
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if len(argv) > 2:
+            paths = [path for path in Path(argv[2]).iterdir() if guess_mime_type(path.name).startswith("image/")]
+        else:
+            print("Generating test images...")
+            paths = _make_benchmark_images(temp_dir)
+        summary = benchmark_thumbnails(paths, workers)
+
+    print(f"{summary['images']} images on {summary['workers']} workers in {summary['seconds']:.2f}s: "
+          f"{summary['images_per_second']:.1f} images/s, "
+          f"{summary['images_per_second_per_core']:.1f} images/s per core")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,8 +1,10 @@
 import json
 import os
-from pathlib import Path
+import threading
 import streamlit as st
 
+import config
+
 # Default settings to use if settings.json doesn't exist
 DEFAULT_SETTINGS = {
     "universities": ["Example University"],
@@ -16,8 +18,12 @@ def create_directory_if_not_exists(directory_path):
         os.makedirs(directory_path)
 
 def load_settings():
-    """Load settings from the settings.json file"""
-    settings_path = Path("data/settings.json")
+    """
+    Load settings from the settings.json file
+
+    Catalog changes are written by catalog_store, never through here.
+    """
+    settings_path = config.settings_path()
     
     if not settings_path.exists():
         # Create the default settings file if it doesn't exist
@@ -33,28 +39,17 @@ def load_settings():
         st.error(f"Error loading settings: {e}")
         return DEFAULT_SETTINGS
 
-def save_settings(settings):
-    """Save settings to the settings.json file"""
-    settings_path = Path("data/settings.json")
-    
-    try:
-        with open(settings_path, 'w') as f:
-            json.dump(settings, f, indent=4)
-        st.session_state.settings = settings
-        return True
-    except Exception as e:
-        st.error(f"Error saving settings: {e}")
-        return False
+def safe_path_name(name):
+    """Replace any characters that might cause issues in file paths"""
+    return name.replace(" ", "_").replace("/", "-")
+
+def get_upload_dir(*path):
+    """Get the upload folder of a university, semester or course path"""
+    return config.uploads_dir().joinpath(*[safe_path_name(name) for name in path])
 
 def get_file_path(university, semester, course):
     """Generate a file path for a given university, semester, and course"""
-    # Replace any characters that might cause issues in file paths
-    safe_uni = university.replace(" ", "_").replace("/", "-")
-    safe_semester = semester.replace(" ", "_").replace("/", "-")
-    safe_course = course.replace(" ", "_").replace("/", "-")
-    
-    # Construct and return the path
-    return Path(f"data/uploads/{safe_uni}/{safe_semester}/{safe_course}")
+    return get_upload_dir(university, semester, course)
 
 def send_email_notification(recipient, subject, message):
     """
@@ -70,6 +65,57 @@ def send_email_notification(recipient, subject, message):
     # Return success assuming the email was sent
     return True
 
+# Guards the notification outbox against concurrent sessions
+_outbox_lock = threading.Lock()
+
+def queue_notifications(notifications):
+    """
+    Append notifications to the outbox in a single write
+    
+    Each notification is a dict with recipient, subject and message keys.
+    Queued notifications are delivered by send_queued_notifications.
+    """
+    if not notifications:
+        return True
+    
+    outbox_path = config.notifications_path()
+    
+    with _outbox_lock:
+        try:
+            queued = []
+            if outbox_path.exists():
+                with open(outbox_path, 'r') as f:
+                    queued = json.load(f)
+            queued.extend(notifications)
+            
+            create_directory_if_not_exists(outbox_path.parent)
+            with open(outbox_path, 'w') as f:
+                json.dump(queued, f, indent=4)
+            return True
+        except Exception as e:
+            print(f"Error queueing notifications: {e}")
+            return False
+
+def send_queued_notifications():
+    """Deliver and clear every queued notification"""
+    outbox_path = config.notifications_path()
+    
+    with _outbox_lock:
+        if not outbox_path.exists():
+            return 0
+        try:
+            with open(outbox_path, 'r') as f:
+                queued = json.load(f)
+        except Exception as e:
+            print(f"Error reading notifications: {e}")
+            return 0
+        
+        # Keep anything that failed to send for the next run
+        failed = [n for n in queued if not send_email_notification(n["recipient"], n["subject"], n["message"])]
+        with open(outbox_path, 'w') as f:
+            json.dump(failed, f, indent=4)
+        return len(queued) - len(failed)
+
 def validate_email(email):
     """Simple email validation"""
     if not email:
@@ -0,0 +1,212 @@
+"""
+Upload watcher for the Student Resource Portal
+Keeps the resource index in line with files changed outside the app
+
+On Linux, inotify reports files created, written, deleted or moved under
+the uploads folder as they happen. Everywhere else, and as a safety net for
+missed events, every indexed folder is reconciled with the disk at an
+interval by a throttled background pass.
+"""
+import ctypes
+import ctypes.util
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+from config import quarantine_dir, uploads_dir
+from resources import get_resource_dir, indexed_folders, is_renaming, reconcile_folder, sync_resource_file
+from storage import Throttle
+
+# inotify event flags, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# inotify_event header: wd, mask, cookie, len
+EVENT_HEADER = struct.Struct("iIII")
+EVENT_BUFFER_SIZE = 64 * 1024
+
+# University, semester, course and resource type folders are watched; files
+# sit directly in the resource type folders
+WATCH_DEPTH = 4
+
+# Seconds between reconciliation passes. A full pass reads every indexed
+# folder, so with inotify running it is only a rare safety net.
+RECONCILE_INTERVAL_SECONDS = 24 * 3600
+RECONCILE_INTERVAL_NO_INOTIFY_SECONDS = 15 * 60
+
+# The reconciliation sleeps RECONCILE_THROTTLE_SLEEP seconds after every
+# RECONCILE_THROTTLE_BATCH files it hashes or folders it reads
+RECONCILE_THROTTLE_BATCH = 200
+RECONCILE_THROTTLE_SLEEP = 0.05
+
+
+class Inotify:
+    """Minimal ctypes binding to the Linux inotify API"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}
+
+    def add_watch(self, path):
+        """Watch a directory, returns False if the watch could not be added"""
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            return False
+        self.paths[wd] = Path(path)
+        return True
+
+    def remove_watches_under(self, path):
+        """Stop watching a directory and everything below it"""
+        for wd, watched in list(self.paths.items()):
+            if watched == path or path in watched.parents:
+                self._rm_watch(self.fd, wd)
+                self.paths.pop(wd, None)
+
+    def read_events(self):
+        """Block until events arrive, then yield (directory, mask, name) for each"""
+        data = os.read(self.fd, EVENT_BUFFER_SIZE)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += length
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            yield self.paths.get(wd), mask, name
+
+
+def reconcile_index(keys=None):
+    """
+    Reconcile indexed folders with the disk, throttled
+
+    keys limits the pass to some folders; by default every indexed folder is
+    read. Folders that were never indexed are skipped, they are read on
+    first use. Returns a summary dict.
+    """
+    throttle = Throttle(RECONCILE_THROTTLE_BATCH, RECONCILE_THROTTLE_SLEEP)
+    summary = {"folders": 0, "written": 0, "removed": 0}
+    for key in (indexed_folders() if keys is None else keys):
+        written, removed = reconcile_folder(key, pause=throttle.tick)
+        summary["folders"] += 1
+        summary["written"] += written
+        summary["removed"] += removed
+        throttle.tick()
+    summary["finished_at"] = time.time()
+    _watch_state["last_reconcile"] = summary
+    return summary
+
+def _indexed_keys_under(path):
+    """Keys of the indexed resource folders at or below a directory"""
+    return [
+        key for key in indexed_folders()
+        if get_resource_dir(*key) == path or path in get_resource_dir(*key).parents
+    ]
+
+def _watch_tree(inotify, path):
+    """Add watches for a directory and its subfolders down to the resource type folders"""
+    root = uploads_dir()
+    for dir_path, dir_names, _ in os.walk(path):
+        dir_path = Path(dir_path)
+        if dir_path == quarantine_dir():
+            dir_names.clear()
+            continue
+        if not inotify.add_watch(dir_path):
+            print(f"Error watching {dir_path}: {os.strerror(ctypes.get_errno())}")
+        if len(dir_path.relative_to(root).parts) >= WATCH_DEPTH:
+            dir_names.clear()
+
+def _handle_event(inotify, directory, mask, name):
+    """Apply one inotify event to the watches and the resource index"""
+    if mask & IN_Q_OVERFLOW:
+        # Events were dropped, so fall back to a full pass
+        reconcile_index()
+        return
+    if directory is None:
+        return
+
+    path = directory / name
+    if mask & IN_ISDIR:
+        if mask & (IN_CREATE | IN_MOVED_TO):
+            _watch_tree(inotify, path)
+        elif mask & IN_MOVED_FROM:
+            inotify.remove_watches_under(path)
+            if is_renaming(path):
+                # The app is renaming this folder and re-keys its rows itself;
+                # dropping them here would lose the files it is moving
+                return
+        # A folder moved in or out carries its files with it. Folders that
+        # were never indexed are read on first use, so only indexed ones are
+        # reconciled: the destination of a move, or the source when files
+        # left the tree. reconcile_folder skips folders mid-rename.
+        reconcile_index(_indexed_keys_under(path))
+        return
+
+    if mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+        sync_resource_file(path)
+
+# State of the background watcher, one per process
+_watch_state = {"thread": None, "inotify": False, "last_reconcile": None}
+_watch_lock = threading.Lock()
+
+def _reconcile_loop(interval):
+    """Reconcile the index forever at a fixed interval"""
+    while True:
+        time.sleep(interval)
+        try:
+            reconcile_index()
+        except Exception as e:
+            print(f"Error reconciling the resource index: {e}")
+
+def _watch_loop():
+    """Follow inotify events, falling back to frequent reconciliation without it"""
+    try:
+        inotify = Inotify()
+        os.makedirs(uploads_dir(), exist_ok=True)
+        _watch_tree(inotify, uploads_dir())
+    except (OSError, AttributeError) as e:
+        print(f"inotify unavailable, reconciling the resource index periodically: {e}")
+        _reconcile_loop(RECONCILE_INTERVAL_NO_INOTIFY_SECONDS)
+        return
+
+    _watch_state["inotify"] = True
+    threading.Thread(
+        target=_reconcile_loop, args=(RECONCILE_INTERVAL_SECONDS,), name="resource-reconcile", daemon=True
+    ).start()
+    while True:
+        try:
+            for directory, mask, name in inotify.read_events():
+                _handle_event(inotify, directory, mask, name)
+        except Exception as e:
+            print(f"Error handling upload events: {e}")
+
+def start_resource_watcher():
+    """Start the background watcher if it is not running in this process"""
+    with _watch_lock:
+        if _watch_state["thread"] is None:
+            _watch_state["thread"] = threading.Thread(target=_watch_loop, name="resource-watcher", daemon=True)
+            _watch_state["thread"].start()
+
+def get_watcher_status():
+    """Get whether inotify is in use and the summary of the last reconciliation"""
+    return {"inotify": _watch_state["inotify"], "last_reconcile": _watch_state["last_reconcile"]}